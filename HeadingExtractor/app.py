@@ -14,9 +14,16 @@
 import os 
 import json
 from pathlib import Path
-from src.extract_text import extract_text_lines_with_dominant_font, group_lines_by_font_style , save_chunks_to_json
-from src.sanitization import analyze_text_lengths
-from src.classify import classify_document_hierarchical
+from src.outline import extract_outline
+from src.parallel_extract import close_pool
+from src import tracing
+
+# MiniLM inference backend: "torch", or an exported "onnx" (int8) / "torchscript" copy
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+# Text extraction library: "pdfminer", or the faster "pymupdf" (span-based, same line records)
+EXTRACT_BACKEND = os.environ.get("EXTRACT_BACKEND", "pdfminer")
+# Processes extracting page ranges of long PDFs in parallel; defaults to one per core
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 1))
 
 def load_pdfs(dir_path="input"):
     pdf_paths=[]
@@ -29,37 +36,14 @@ def load_pdfs(dir_path="input"):
 if __name__ == '__main__':
     for pdf_file_path in load_pdfs():
         
-        # extract data 
-        extracted_lines = extract_text_lines_with_dominant_font(pdf_file_path)
-        font_chunks=group_lines_by_font_style(extracted_lines)
-        json_data= save_chunks_to_json(font_chunks)
-        # for i, chunk in enumerate(font_chunks):
-        #     style = (chunk[0]['font_name'], chunk[0]['font_size'])
-        #     print(f"\n[ Chunk {i+1}: Style={style}, Lines={len(chunk)} ]")
-        #     sample_lines = chunk[:5]
-        #     for j, line in enumerate(sample_lines):
-        #         print(f"  Line {j+1} (Page {line['page']}): {line['text']}")
-        #     if len(chunk) > 5:
-        #         print(f"  ... and {len(chunk) - 5} more lines with the same style")
-        # print("-" * 50)
-   
-        # sanitise data 
-
-        selected_groups=analyze_text_lengths(json_data)
-        # print(str(selected_groups))
-        # output_path="output.json"
-        # with open(output_path, "w", encoding="utf-8") as f:
-        #     json.dump(selected_groups, f, indent=4, ensure_ascii=False)
-        # for grp in selected_groups['selected_groups']:
-        #     print("Group: -------------------")
-        #     for lines in grp['lines']:
-        #         print("-=-=-=-=-=-=-")
-        #         print(lines['text'])
         pdf_stem = Path(pdf_file_path).stem  # 'file.pdf' -> 'file'
         output_path = f"output/{pdf_stem}.json"     # => 'file.json'
 
-        # Now save the output
-        result = classify_document_hierarchical(
-            selected_groups,
-            base_path='embeddings',
-            output_file=output_path)
\ No newline at end of file
+        # extract, sanitise and classify, then save the output; one trace per PDF
+        tracer = tracing.tracer_from_env(pdf_stem)
+        with tracing.use_tracer(tracer):
+            result = extract_outline(pdf_file_path, output_path, base_path='embeddings', backend=EMBED_BACKEND,
+                                     extract_backend=EXTRACT_BACKEND, extract_workers=EXTRACT_WORKERS)
+        tracing.export_from_env(tracer)
+        print(f"📊 {tracer.summary()}")
+    close_pool()  # the extraction workers, kept across PDFs
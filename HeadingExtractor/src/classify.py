@@ -1,9 +1,8 @@
 import json
 import os
 import glob
-import torch
-import pandas as pd 
-from sentence_transformers import SentenceTransformer, util
+from src.model_registry import get_sentence_transformer
+from src import tracing
 from collections import Counter
 
 # The input data structure remains the same.
@@ -46,17 +45,25 @@ document_data = {
     ]
 }
 
-def classify_document_hierarchical(data, base_path='L12', output_file='classified_document.json'):
+def classify_document_hierarchical(data, base_path='L12', output_file='classified_document.json',
+                                   model_path='./all-MiniLM-L12-v2', model=None, backend='torch'):
     """
     Classifies a document using hierarchical structure with group-based predictions
     and maintains H1->H2->H3 hierarchy based on font sizes and semantic embeddings.
+
+    Pass `model` to reuse an already loaded SentenceTransformer; otherwise
+    the model is loaded with `backend` ("torch", "onnx" or "torchscript").
     """
+    # torch and sentence_transformers take seconds to import; only classification needs them
+    import torch
+    from sentence_transformers import util
     
     ## ----------------------------------------------------------------
     ## Part 1: Load Model and Embeddings from Directory
     ## ----------------------------------------------------------------
-    print("✅ Step 1: Loading model and embeddings from directory...")
-    model = SentenceTransformer('./all-MiniLM-L12-v2')
+    tracing.log("✅ Step 1: Loading model and embeddings from directory...")
+    if model is None:
+        model = get_sentence_transformer(model_path, backend=backend)
 
     heading_map = {'Title': 'title', 'H1': 'h1', 'H2': 'h2', 'H3': 'h3'}
     heading_embeddings = {}
@@ -73,11 +80,11 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
             # Load each tensor file and concatenate them
             tensors = [torch.load(fp, map_location=model.device) for fp in file_paths]
             heading_embeddings[level_name] = torch.cat(tensors, dim=0)
-            print(f"   -> Loaded {len(file_paths)} embedding files for '{level_name}'.")
+            tracing.log(f"   -> Loaded {len(file_paths)} embedding files for '{level_name}'.", verbose=True)
 
     except (FileNotFoundError, RuntimeError) as e:
-        print(f"   ⚠️  Warning: Could not load embeddings from disk ({e}).")
-        print("   -> Falling back to simulation mode.")
+        tracing.log(f"   ⚠️  Warning: Could not load embeddings from disk ({e}).")
+        tracing.log("   -> Falling back to simulation mode.")
         # Fallback simulation if .pt files aren't found
         simulated_headings = {
             "Title": ["A Report on Deep Learning", "The Future of AI", "An Analysis of Market Trends"],
@@ -93,7 +100,7 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
     ## ----------------------------------------------------------------
     ## Part 2: Classify Individual Lines and Group by Structure
     ## ----------------------------------------------------------------
-    print("\n✅ Step 2: Classifying individual lines within groups...")
+    tracing.log("\n✅ Step 2: Classifying individual lines within groups...")
     CLASSIFICATION_THRESHOLD = 0.4
     
     # Store groups with their classifications
@@ -118,6 +125,7 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
                 
             valid_lines.append(line)
             line_embedding = model.encode(line_text, convert_to_tensor=True)
+            tracing.count("lines_encoded")
             scores = {}
             
             # Calculate semantic similarity scores
@@ -164,7 +172,7 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
     ## ----------------------------------------------------------------
     ## Part 3: Identify Title Group and Apply Hierarchical Logic
     ## ----------------------------------------------------------------
-    print("\n✅ Step 3: Identifying title group and applying hierarchical structure...")
+    tracing.log("\n✅ Step 3: Identifying title group and applying hierarchical structure...")
     
     # Calculate average character length for each group
     groups_with_avg_length = []
@@ -183,7 +191,7 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
         })
     
     # Find title group using max font size and min average character length logic
-    print("   -> Analyzing groups for title identification...")
+    tracing.log("   -> Analyzing groups for title identification...", verbose=True)
     max_font_size = max(group['font_size'] for group in groups_with_avg_length)
     
     # Get groups with maximum font size
@@ -196,9 +204,9 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
     title_texts = [line['text'].strip() for line in title_group['lines']]
     final_title = ' '.join(title_texts) if title_texts else "Untitled"
     
-    print(f"   -> Title group identified: Group {title_group['group_no']}")
-    print(f"   -> Font size: {title_group['font_size']}, Avg char length: {title_group['avg_char_length']:.2f}")
-    print(f"   -> Title text: '{final_title}'")
+    tracing.log(f"   -> Title group identified: Group {title_group['group_no']}")
+    tracing.log(f"   -> Font size: {title_group['font_size']}, Avg char length: {title_group['avg_char_length']:.2f}")
+    tracing.log(f"   -> Title text: '{final_title}'")
     
     # Remove title group from classification list
     classified_groups = [g for g in classified_groups if g['group_no'] != title_group['group_no']]
@@ -211,7 +219,7 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
     font_to_level_mapping = {}
     current_hierarchy_level = None
     
-    print(f"   -> Applying dynamic hierarchical progression...")
+    tracing.log(f"   -> Applying dynamic hierarchical progression...", verbose=True)
     
     for group in classified_groups:
         font_size = group['font_size']
@@ -219,47 +227,47 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
         
         # Skip content groups for outline
         if predicted_level == 'Content':
-            print(f"      Group {group['group_no']} (font {font_size}): Skipped as Content")
+            tracing.log(f"      Group {group['group_no']} (font {font_size}): Skipped as Content", verbose=True)
             continue
         
         # Check if this font size already has a level assigned
         if font_size in font_to_level_mapping:
             assigned_level = font_to_level_mapping[font_size]
-            print(f"      Group {group['group_no']} (font {font_size}): Using existing mapping → {assigned_level}")
+            tracing.log(f"      Group {group['group_no']} (font {font_size}): Using existing mapping → {assigned_level}", verbose=True)
         else:
             # Dynamic hierarchy assignment based on detection order
             if current_hierarchy_level is None:
                 # First valid heading group becomes H1
                 assigned_level = 'H1'
                 current_hierarchy_level = 'H1'
-                print(f"      Group {group['group_no']} (font {font_size}): First heading → H1")
+                tracing.log(f"      Group {group['group_no']} (font {font_size}): First heading → H1", verbose=True)
             elif current_hierarchy_level == 'H1':
                 # After H1, next different font size becomes H2
                 if font_size != [g['font_size'] for g in classified_groups if g['group_no'] < group['group_no'] and font_to_level_mapping.get(g['font_size']) == 'H1'][:1]:
                     assigned_level = 'H2'
                     current_hierarchy_level = 'H2'
-                    print(f"      Group {group['group_no']} (font {font_size}): Next level → H2")
+                    tracing.log(f"      Group {group['group_no']} (font {font_size}): Next level → H2", verbose=True)
                 else:
                     assigned_level = 'H1'  # Same font size as previous H1
-                    print(f"      Group {group['group_no']} (font {font_size}): Same font as H1 → H1")
+                    tracing.log(f"      Group {group['group_no']} (font {font_size}): Same font as H1 → H1", verbose=True)
             elif current_hierarchy_level == 'H2':
                 # After H2, next different font size becomes H3
                 existing_h2_fonts = [fs for fs, level in font_to_level_mapping.items() if level == 'H2']
                 if font_size not in existing_h2_fonts and font_size not in [fs for fs, level in font_to_level_mapping.items() if level == 'H1']:
                     assigned_level = 'H3'
                     current_hierarchy_level = 'H3'
-                    print(f"      Group {group['group_no']} (font {font_size}): Next level → H3")
+                    tracing.log(f"      Group {group['group_no']} (font {font_size}): Next level → H3", verbose=True)
                 else:
                     # Same font size as existing H2 or H1
                     assigned_level = font_to_level_mapping.get(font_size, 'H2')
-                    print(f"      Group {group['group_no']} (font {font_size}): Existing font mapping → {assigned_level}")
+                    tracing.log(f"      Group {group['group_no']} (font {font_size}): Existing font mapping → {assigned_level}", verbose=True)
             else:
                 # H3 or beyond - check if font size already mapped
                 if font_size in font_to_level_mapping:
                     assigned_level = font_to_level_mapping[font_size]
                 else:
                     assigned_level = 'H3'  # Default to H3 for new font sizes
-                print(f"      Group {group['group_no']} (font {font_size}): Default to → {assigned_level}")
+                tracing.log(f"      Group {group['group_no']} (font {font_size}): Default to → {assigned_level}", verbose=True)
             
             # Map this font size to the assigned level
             font_to_level_mapping[font_size] = assigned_level
@@ -272,14 +280,14 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
                 'page': line['page_no']
             })
     
-    print(f"   -> Final font size to level mapping:")
+    tracing.log(f"   -> Final font size to level mapping:", verbose=True)
     for font_size, level in sorted(font_to_level_mapping.items(), reverse=True):
-        print(f"      Font size {font_size} → {level}")
+        tracing.log(f"      Font size {font_size} → {level}", verbose=True)
     
     ## ----------------------------------------------------------------
     ## Part 4: Create Final JSON Structure and Save
     ## ----------------------------------------------------------------
-    print("\n✅ Step 4: Creating final JSON structure...")
+    tracing.log("\n✅ Step 4: Creating final JSON structure...")
     
     # Sort by page number for final outline
     outline = sorted(hierarchical_groups, key=lambda x: x['page'])
@@ -293,15 +301,16 @@ def classify_document_hierarchical(data, base_path='L12', output_file='classifie
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(final_result, f, indent=2, ensure_ascii=False)
     
-    print(f"✅ Results saved to '{output_file}'")
+    tracing.log(f"✅ Results saved to '{output_file}'")
     
-    print(f"\n--- Classification Summary ---")
-    print(f"Title: {final_title}")
-    print(f"Title identified from: Group {title_group['group_no']} (Font: {title_group['font_size']}, Avg chars: {title_group['avg_char_length']:.2f})")
-    print(f"Total outline items: {len(outline)}")
+    tracing.log(f"\n--- Classification Summary ---")
+    tracing.log(f"Title: {final_title}")
+    tracing.log(f"Title identified from: Group {title_group['group_no']} (Font: {title_group['font_size']}, Avg chars: {title_group['avg_char_length']:.2f})")
+    tracing.log(f"Total outline items: {len(outline)}")
+    tracing.count("outline_items", len(outline))
     level_counts = Counter(item['level'] for item in outline)
     for level, count in level_counts.items():
-        print(f"{level}: {count} items")
+        tracing.log(f"{level}: {count} items", verbose=True)
     
     return final_result
 
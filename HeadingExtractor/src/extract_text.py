@@ -2,70 +2,278 @@
 # ok lets go 
 import itertools
 import json
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Iterator, Optional
 from collections import defaultdict, Counter
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextContainer, LTTextLine, LTChar, LTAnno
-
-def extract_text_lines_with_dominant_font(pdf_path: str) -> List[Dict[str, Any]]:
-    """
-    Extracts text lines from a PDF and computes dominant font properties based on words.
-    """
-    lines_data = []
-    print(f"Processing PDF: {pdf_path}...")
+from src import tracing
+
+# Text extraction libraries: pdfminer.six lays out every character in Python;
+# PyMuPDF reads whole spans from MuPDF and is several times faster
+EXTRACT_BACKENDS = ("pdfminer", "pymupdf")
+# pdfminer's LAParams defaults, used to join PyMuPDF lines that pdfminer sees as one
+LINE_OVERLAP = 0.5
+CHAR_MARGIN = 2.0
+WORD_MARGIN = 0.1
+# Symbol-font characters MuPDF leaves in the Private Use Area, as pdfminer decodes them
+_SYMBOL_CHARS = str.maketrans({"\uf0b7": "•"})
+
+Font = Tuple[str, float]
+Words = List[Tuple[str, List[Font]]]
+# (page, words of each text line, error); a page that fails has no lines and an error message
+PageLines = Tuple[int, List[Words], Optional[str]]
+
+
+def _pdfminer_pages(pdf_path: str, first: int = 0, last: Optional[int] = None) -> Iterator[PageLines]:
+    """Lines of pages first to last (exclusive), each word with the font of every character"""
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    # What pdfminer's extract_pages() does, one page at a time so a broken page is skipped alone
+    with open(pdf_path, "rb") as fp:
+        resources = PDFResourceManager(caching=True)
+        device = PDFPageAggregator(resources, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resources, device)
+        for page_num, page in enumerate(PDFPage.get_pages(fp, caching=True)):
+            if page_num < first:
+                continue
+            if last is not None and page_num >= last:
+                break
+            try:
+                interpreter.process_page(page)
+                lines, error = list(_pdfminer_layout_lines(device.get_result())), None
+            except Exception as e:
+                lines, error = [], f"{type(e).__name__}: {e}"
+            yield page_num, lines, error
+
+
+def _pdfminer_layout_lines(page_layout) -> Iterator[Words]:
+    from pdfminer.layout import LTTextContainer, LTTextLine, LTChar, LTAnno
+
+    for element in page_layout:
+        if not isinstance(element, LTTextContainer):
+            continue
 
-    try:
-        for page_num, page_layout in enumerate(extract_pages(pdf_path)):
-            for element in page_layout:
-                if not isinstance(element, LTTextContainer):
-                    continue
+        for text_line in element:
+            if not isinstance(text_line, LTTextLine):
+                continue
 
-                for text_line in element:
-                    if not isinstance(text_line, LTTextLine):
-                        continue
+            words = []
+            current_word = ""
+            current_word_fonts = []
 
-                    words = []
+            for char in text_line:
+                if isinstance(char, LTChar):
+                    current_word += char.get_text()
+                    current_word_fonts.append((char.fontname, round(char.size, 2)))
+                elif isinstance(char, LTAnno) and char.get_text() == " ":
+                    if current_word.strip():
+                        words.append((current_word.strip(), current_word_fonts.copy()))
                     current_word = ""
                     current_word_fonts = []
 
-                    for char in text_line:
-                        if isinstance(char, LTChar):
-                            current_word += char.get_text()
-                            current_word_fonts.append((char.fontname, round(char.size, 2)))
-                        elif isinstance(char, LTAnno) and char.get_text() == " ":
-                            if current_word.strip():
-                                words.append((current_word.strip(), current_word_fonts.copy()))
-                            current_word = ""
-                            current_word_fonts = []
-
-                    if current_word.strip():
-                        words.append((current_word.strip(), current_word_fonts.copy()))
+            if current_word.strip():
+                words.append((current_word.strip(), current_word_fonts.copy()))
+
+            yield words
+
+
+class _GlyphWidths:
+    """Advance width of the last (or first) glyph of a span, from the embedded fonts of the current page"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.page = None
+        self.fonts = {}
+
+    def __call__(self, span: Dict, first: bool = False) -> float:
+        import fitz
+        font = self.fonts.get(span["font"])
+        if font is None:
+            xref = next((f[0] for f in self.page.get_fonts() if f[3] == span["font"]), 0)
+            try:
+                font = fitz.Font(fontbuffer=self.doc.extract_font(xref)[3])
+            except Exception:  # not embedded (or unknown): fall back to a Base-14 lookalike
+                font = fitz.Font("helv")
+            self.fonts[span["font"]] = font
+        return font.glyph_advance(ord(span["text"][0 if first else -1])) * span["size"]
+
+
+def _pymupdf_pages(pdf_path: str, first: int = 0, last: Optional[int] = None) -> Iterator[PageLines]:
+    """Lines of pages first to last (exclusive) from PyMuPDF's spans, in pdfminer's terms.
+
+    pdfminer ends a word only where it finds a gap between glyphs, not at
+    space characters in the PDF, and takes the font of the word's last
+    character, trailing spaces included; here the gaps are those between
+    spans. Its lines run while glyphs overlap vertically by LINE_OVERLAP of
+    the lower one's height and lie less than CHAR_MARGIN glyph widths apart,
+    so MuPDF lines are split or joined to match (e.g. a bullet and its text).
+    Gaps MuPDF fills with a space inside a span are not told apart from space
+    characters, so in PDFs without them a line in several fonts can take
+    another font than pdfminer gives it.
+    """
+    import fitz  # PyMuPDF; imported here so the pdfminer backend does not need it
 
-                    if not words:
-                        continue
+    keep_subsets = fitz.TOOLS.set_subset_fontnames()
+    fitz.TOOLS.set_subset_fontnames(True)  # pdfminer's font names keep the "ABCDEF+" subset tag
+    try:
+        with fitz.open(pdf_path) as doc:
+            glyph_width = _GlyphWidths(doc)
+            for page_num in range(first, len(doc) if last is None else min(last, len(doc))):
+                try:
+                    glyph_width.page = doc[page_num]
+                    lines, error = list(_pymupdf_page_lines(glyph_width.page, glyph_width)), None
+                except Exception as e:
+                    lines, error = [], f"{type(e).__name__}: {e}"
+                yield page_num, lines, error
+    finally:
+        fitz.TOOLS.set_subset_fontnames(bool(keep_subsets))
+
+
+def _pymupdf_page_lines(page, glyph_width: _GlyphWidths) -> Iterator[Words]:
+    import fitz
+
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        runs, previous_line, previous_span = [], None, None
+        for line in block.get("lines", ()):
+            spans = [s for s in line["spans"] if s["text"]]
+            if not spans:
+                continue
+            same_row = previous_line is not None and _same_row(previous_line, line)
+            for i, span in enumerate(spans):
+                text = span["text"].translate(_SYMBOL_CHARS)
+                font = (span["font"], round(span["size"], 2))
+                if previous_span is not None:
+                    gap = span["bbox"][0] - previous_span["bbox"][2]
+                    word_gap = WORD_MARGIN * span["size"]
+                    if (not i and not same_row) or (gap > word_gap and gap >= CHAR_MARGIN * max(
+                            glyph_width(previous_span), glyph_width(span, first=True))):
+                        yield _words(runs)  # pdfminer starts a new line here
+                        runs = []
+                    elif gap <= word_gap:
+                        text = runs.pop()[0] + text  # no gap: the same word
+                runs.append((text, font))
+                previous_span = span
+            previous_line = line
+        if runs:
+            yield _words(runs)
+
+
+def iter_page_lines(pdf_path: str, backend: str = "pdfminer", first: int = 0,
+                    last: Optional[int] = None) -> Iterator[PageLines]:
+    """(page, lines, error) for pages first to last (exclusive) in page order, extracted with backend"""
+    return (_pymupdf_pages if backend == "pymupdf" else _pdfminer_pages)(pdf_path, first, last)
+
+
+def extract_per_page(pdf_path: str, backend: str, first: int, last: int) -> List[PageLines]:
+    """Pages first to last read one at a time, so a failure loses only the page it hits"""
+    pages = []
+    for page_num in range(first, last):
+        try:
+            pages.extend(iter_page_lines(pdf_path, backend, page_num, page_num + 1))
+        except Exception as e:
+            pages.append((page_num, [], f"{type(e).__name__}: {e}"))
+    return pages
+
+
+def _iter_pages_serial(pdf_path: str, backend: str) -> Iterator[PageLines]:
+    """iter_page_lines, continued page by page from where it stopped if reading the document fails"""
+    next_page = 0
+    try:
+        for page in iter_page_lines(pdf_path, backend):
+            next_page = page[0] + 1
+            yield page
+    except Exception as e:
+        tracing.count("extract_errors")
+        tracing.log(f"⚠️ Reading stopped at page {next_page + 1} ({e}); retrying one page at a time",
+                    error=f"{type(e).__name__}: {e}")
+        yield from extract_per_page(pdf_path, backend, next_page, page_count(pdf_path, backend))
+
+
+def page_count(pdf_path: str, backend: str = "pdfminer") -> int:
+    if backend == "pymupdf":
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    from pdfminer.pdfpage import PDFPage
+    with open(pdf_path, "rb") as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+
+def _words(runs: List[Tuple[str, Font]]) -> Words:
+    return [(text.strip(), [font]) for text, font in runs if text.strip()]
+
+
+def _same_row(previous_line: Dict, line: Dict) -> bool:
+    """Whether line starts right of previous_line and overlaps it vertically as pdfminer requires"""
+    x0, y0, x1, y1 = previous_line["bbox"]
+    nx0, ny0, nx1, ny1 = line["bbox"]
+    overlap = min(y1, ny1) - max(y0, ny0)
+    return previous_line["dir"] == line["dir"] and nx0 >= x1 and overlap > LINE_OVERLAP * min(y1 - y0, ny1 - ny0)
+
+
+def _line_record(page_num: int, words: Words) -> Dict[str, Any]:
+    all_fonts = [fonts[-1] for _, fonts in words if fonts]
+    font_counter = Counter(all_fonts)
+    dominant_font, _ = font_counter.most_common(1)[0]
+
+    line_text = " ".join(word for word, _ in words)
+
+    return {
+        "page": page_num ,
+        "text": line_text,
+        "font_name": dominant_font[0],
+        "font_size": dominant_font[1],
+        "is_bold": "Bold" in dominant_font[0],
+        "fonts_per_word": [
+            {"word": word, "font": fonts[-1] if fonts else None}
+            for word, fonts in words
+        ]
+    }
 
-                    all_fonts = [fonts[-1] for _, fonts in words if fonts]
-                    font_counter = Counter(all_fonts)
-                    dominant_font, _ = font_counter.most_common(1)[0]
 
-                    line_text = " ".join(word for word, _ in words)
+def extract_text_lines_with_dominant_font(pdf_path: str, backend: str = "pdfminer",
+                                          workers: int = 1) -> List[Dict[str, Any]]:
+    """
+    Extracts text lines from a PDF and computes dominant font properties based on words.
+    backend is "pdfminer" or "pymupdf" (see EXTRACT_BACKENDS); both produce the same line records.
+    With workers > 1, page ranges of long PDFs are extracted in parallel processes; lines
+    still come out in page order. A page that fails to extract is skipped with a warning; if
+    reading the document fails partway, the remaining pages are retried one at a time.
+    """
+    if backend not in EXTRACT_BACKENDS:
+        raise ValueError(f"Unknown extraction backend '{backend}', expected one of {', '.join(EXTRACT_BACKENDS)}")
+    if backend == "pymupdf":
+        try:
+            import fitz  # noqa: F401
+        except ImportError:
+            tracing.log("⚠️ PyMuPDF is not installed; extracting with pdfminer")
+            backend = "pdfminer"
 
-                    lines_data.append({
-                        "page": page_num ,
-                        "text": line_text,
-                        "font_name": dominant_font[0],
-                        "font_size": dominant_font[1],
-                        "is_bold": "Bold" in dominant_font[0],
-                        "fonts_per_word": [
-                            {"word": word, "font": fonts[-1] if fonts else None}
-                            for word, fonts in words
-                        ]
-                    })
+    lines_data = []
+    failed_pages = 0
+    tracing.log(f"Processing PDF: {pdf_path}...")
+
+    if workers > 1:
+        from src.parallel_extract import extract_pages_parallel
+        pages = extract_pages_parallel(pdf_path, backend, workers)
+    else:
+        pages = _iter_pages_serial(pdf_path, backend)
+    for page_num, lines, error in pages:
+        tracing.count("pages")
+        if error is not None:
+            failed_pages += 1
+            tracing.log(f"⚠️ Skipping page {page_num + 1}: {error}", page=page_num, error=error)
+            continue
+        for words in lines:
+            if words:
+                lines_data.append(_line_record(page_num, words))
 
-        print("Successfully extracted text lines with dominant font.")
-    except Exception as e:
-        print(f"Error processing PDF: {e}")
+    tracing.log("Successfully extracted text lines with dominant font." if not failed_pages else
+                f"Extracted text lines with dominant font, skipping {failed_pages} failed page(s).")
 
+    tracing.count("page_errors", failed_pages)
+    tracing.count("lines", len(lines_data))
     return lines_data
 
 def group_lines_by_font_style(lines: List[Dict]) -> List[List[Dict]]:
@@ -75,7 +283,7 @@ def group_lines_by_font_style(lines: List[Dict]) -> List[List[Dict]]:
     if not lines:
         return []
 
-    print("Grouping all lines by font style...")
+    tracing.log("Grouping all lines by font style...")
 
     style_groups = defaultdict(list)
 
@@ -85,9 +293,10 @@ def group_lines_by_font_style(lines: List[Dict]) -> List[List[Dict]]:
 
     grouped_chunks = list(style_groups.values())
 
-    print(f"Created {len(grouped_chunks)} unique font style groups.")
+    tracing.count("font_groups", len(grouped_chunks))
+    tracing.log(f"Created {len(grouped_chunks)} unique font style groups.")
     for i, (style, lines_in_group) in enumerate(style_groups.items()):
-        print(f"  Group {i+1}: {style} - {len(lines_in_group)} lines")
+        tracing.log(f"  Group {i+1}: {style} - {len(lines_in_group)} lines", verbose=True)
 
     return grouped_chunks
 
@@ -100,7 +309,7 @@ def save_chunks_to_json(font_chunks: List[List[Dict]], output_file: str = "pdf_f
         "groups": []
     }
 
-    print(f"Saving {len(font_chunks)} font groups to JSON...")
+    tracing.log(f"Saving {len(font_chunks)} font groups to JSON...")
 
     for group_no, chunk in enumerate(font_chunks, 1):
         if not chunk:
@@ -145,12 +354,12 @@ def group_consecutive_lines_by_font(lines: List[Dict]) -> List[List[Dict]]:
     if not lines:
         return []
 
-    print("Grouping consecutive lines by font style...")
+    tracing.log("Grouping consecutive lines by font style...")
 
     key_func = lambda line: (line['font_name'], line['font_size'])
     grouped_chunks = [list(group) for _, group in itertools.groupby(lines, key=key_func)]
 
-    print(f"Created {len(grouped_chunks)} chunks.")
+    tracing.log(f"Created {len(grouped_chunks)} chunks.")
     return grouped_chunks
 
 def main():
@@ -0,0 +1,253 @@
+# Identical copies live in RetrivalAndGenerator/scripts and HeadingExtractor/src, which are
+# built as separate containers; `python -m benchmarks.shared_modules` checks they match
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+# "torch" is SentenceTransformer itself; the others run an exported copy of its transformer
+BACKENDS = ("torch", "onnx", "torchscript")
+# Exports whose vectors agree less than this (cosine, worst sample) with PyTorch's are not used
+PARITY_MIN_COSINE = 0.98
+# Parity samples: headings, sentences and a chunk long enough to be truncated
+PARITY_TEXTS = [
+    "Introduction",
+    "III. RELATED WORKS",
+    "Comprehensive Guide to Major Cities in the South of France",
+    "Create and convert PDFs from Microsoft Office files.",
+    "The Old Port has been a bustling harbor for over 2,600 years; today it is filled with cafes.",
+    "Falafel: chickpea fritters served with tahini sauce, pickles and fresh herbs in warm pita.",
+    "To fill a form, select Fill & Sign in the right pane and click a field to type your answer. " * 12,
+    "Q3 revenue grew 12% (from $4.1M to $4.6M) while operating costs fell by 3%.",
+]
+
+
+def export_dir(model_path: str, backend: str) -> Path:
+    """Exports sit next to the model, not inside it, so they do not change its fingerprint"""
+    path = Path(model_path)
+    return path.parent / f"{path.name}.{backend}"
+
+
+def _source_fingerprint(model_path: str) -> str:
+    digest = hashlib.sha256()
+    for f in sorted(p for p in Path(model_path).rglob("*") if p.is_file()):
+        digest.update(f"{f.relative_to(model_path)}:{f.stat().st_size}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _read_pipeline(model_path: str) -> Dict:
+    """Pooling, normalization and max_seq_length of a saved Transformer -> Pooling [-> Normalize] model"""
+    root = Path(model_path)
+    with open(root / "modules.json", "r", encoding="utf-8") as f:
+        modules = json.load(f)
+    kinds = [m["type"].rsplit(".", 1)[-1] for m in modules]
+    if kinds not in (["Transformer", "Pooling"], ["Transformer", "Pooling", "Normalize"]):
+        raise ValueError(f"Only Transformer, Pooling and Normalize modules can be exported, not {kinds}")
+    with open(root / modules[1]["path"] / "config.json", "r", encoding="utf-8") as f:
+        pooling = json.load(f)
+    # Newer sentence-transformers write "pooling_mode"; older ones one flag per mode
+    mode = pooling.get("pooling_mode") or next(
+        (m for m in ("mean", "cls", "max") if pooling.get(f"pooling_mode_{m}_tokens") or pooling.get(f"pooling_mode_{m}_token")),
+        None)
+    if mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Unsupported pooling mode {mode!r}")
+    with open(root / "sentence_bert_config.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return {
+        "pooling": mode,
+        "normalize": kinds[-1] == "Normalize",
+        "max_seq_length": config.get("max_seq_length", 128),
+        "lowercase": config.get("do_lower_case", False),
+        "dim": pooling.get("embedding_dimension") or pooling.get("word_embedding_dimension"),
+    }
+
+
+class ExportedSentenceEncoder:
+    """SentenceTransformer.encode() look-alike running an exported transformer.
+
+    Tokenizes with the model's tokenizer.json, runs the ONNX Runtime session
+    or TorchScript module, then pools and normalizes in numpy exactly as the
+    saved sentence-transformers pipeline does. Batches are formed from texts
+    of similar length, as SentenceTransformer does, to limit padding.
+    """
+
+    device = "cpu"
+
+    def __init__(self, model_path: str, backend: str, run: Callable[[Dict[str, np.ndarray]], np.ndarray],
+                 input_names: List[str], pipeline: Dict):
+        from tokenizers import Tokenizer
+        self.model_path = model_path
+        self.backend = backend
+        self.run = run
+        self.input_names = input_names
+        self.pipeline = pipeline
+        self.tokenizer = Tokenizer.from_file(str(Path(model_path) / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=pipeline["max_seq_length"])
+        self.tokenizer.no_padding()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.pipeline["dim"]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        feeds = {name: np.zeros((len(texts), length), dtype=np.int64) for name in self.input_names}
+        for row, e in enumerate(encodings):
+            n = len(e.ids)
+            feeds["input_ids"][row, :n] = e.ids
+            feeds["attention_mask"][row, :n] = e.attention_mask
+            if "token_type_ids" in feeds:
+                feeds["token_type_ids"][row, :n] = e.type_ids
+        hidden = self.run(feeds)
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        if self.pipeline["pooling"] == "cls":
+            vectors = hidden[:, 0]
+        elif self.pipeline["pooling"] == "max":
+            vectors = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.pipeline["normalize"]:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype(np.float32, copy=False)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, convert_to_tensor: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if self.pipeline["lowercase"]:
+            texts = [t.lower() for t in texts]
+        embeddings = np.empty((len(texts), self.pipeline["dim"]), dtype=np.float32)
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([texts[i] for i in rows])
+        result = embeddings[0] if single else embeddings
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(np.ascontiguousarray(result))
+        return result
+
+
+def _example_inputs(model) -> Dict:
+    features = model.tokenizer(["An example sentence to trace the model with."], return_tensors="pt")
+    return {name: features[name] for name in ("input_ids", "attention_mask", "token_type_ids") if name in features}
+
+
+def _hidden_states_module(model):
+    """The model's transformer as a module returning only the last hidden states"""
+    import torch
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids)[0]
+
+    return HiddenStates(model[0].auto_model).eval()
+
+
+def _export_onnx(model, out_dir: Path) -> List[str]:
+    """model.onnx in float32, then model.int8.onnx with dynamically quantized int8 weights"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    inputs = _example_inputs(model)
+    names = list(inputs)
+    axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    with torch.no_grad():
+        torch.onnx.export(_hidden_states_module(model), tuple(inputs.values()), str(out_dir / "model.onnx"),
+                          input_names=names, output_names=["last_hidden_state"],
+                          dynamic_axes={**axes, "last_hidden_state": {0: "batch", 1: "sequence"}},
+                          opset_version=17, dynamo=False)
+    quantize_dynamic(str(out_dir / "model.onnx"), str(out_dir / "model.int8.onnx"), weight_type=QuantType.QInt8,
+                     per_channel=True)
+    return names
+
+
+def _export_torchscript(model, out_dir: Path) -> List[str]:
+    """model.pt: the transformer traced and frozen for inference"""
+    import torch
+
+    inputs = _example_inputs(model)
+    with torch.no_grad():
+        traced = torch.jit.trace(_hidden_states_module(model), tuple(inputs.values()), check_trace=False)
+        torch.jit.save(torch.jit.freeze(traced), str(out_dir / "model.pt"))
+    return list(inputs)
+
+
+def _runner(out_dir: Path, backend: str, threads: Optional[int]) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    if backend == "onnx":
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(str(out_dir / "model.int8.onnx"), options, providers=["CPUExecutionProvider"])
+        return lambda feeds: session.run(None, feeds)[0]
+
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    module = torch.jit.load(str(out_dir / "model.pt"))
+
+    def run(feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        with torch.inference_mode():
+            return module(*(torch.from_numpy(v) for v in feeds.values())).numpy()
+    return run
+
+
+def parity(reference, candidate, texts: List[str] = PARITY_TEXTS) -> Dict[str, float]:
+    """Cosine agreement between two encoders' vectors for the same texts"""
+    a = np.asarray(reference.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    b = np.asarray(candidate.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return {"mean_cosine": float(cosine.mean()), "min_cosine": float(cosine.min())}
+
+
+def load_exported(model_path: str, backend: str, load_torch: Callable[[], Any],
+                  threads: Optional[int] = None) -> ExportedSentenceEncoder:
+    """Encoder for backend ("onnx" or "torchscript"), exporting the model on first use.
+
+    The export, its parity with PyTorch on PARITY_TEXTS and the source model's
+    fingerprint are kept in export_dir(model_path, backend); a changed model is
+    exported again. Raises ValueError when the export fails the parity check.
+    """
+    if backend not in BACKENDS[1:]:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    pipeline = _read_pipeline(model_path)
+    out_dir = export_dir(model_path, backend)
+    meta_path = out_dir / "export.json"
+    source = _source_fingerprint(model_path)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+
+    if meta.get("source") != source:
+        print(f"📦 Exporting {model_path} for {backend}...")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        reference = load_torch()
+        input_names = (_export_onnx if backend == "onnx" else _export_torchscript)(reference, out_dir)
+        encoder = ExportedSentenceEncoder(model_path, backend, _runner(out_dir, backend, threads), input_names, pipeline)
+        meta = {"source": source, "backend": backend, "input_names": input_names,
+                "parity": parity(reference, encoder), "export_s": time.perf_counter() - start}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        print(f"📦 {backend} export agrees with PyTorch: mean cosine {meta['parity']['mean_cosine']:.4f}, "
+              f"min {meta['parity']['min_cosine']:.4f}")
+    else:
+        encoder = ExportedSentenceEncoder(model_path, backend, _runner(out_dir, backend, threads),
+                                          meta["input_names"], pipeline)
+
+    if meta["parity"]["min_cosine"] < PARITY_MIN_COSINE:
+        raise ValueError(f"{backend} export of {model_path} failed the parity check "
+                         f"(min cosine {meta['parity']['min_cosine']:.4f} < {PARITY_MIN_COSINE})")
+    return encoder
@@ -0,0 +1,34 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+# One instance per (kind, resolved path, backend) for the whole process
+_models: Dict[Tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def get_sentence_transformer(model_path: str = "./all-MiniLM-L12-v2", backend: str = "torch"):
+    """Return the process-wide SentenceTransformer for model_path and backend, loading it once.
+
+    backend "onnx" (int8 ONNX Runtime) or "torchscript" returns an exported
+    copy with the same encode() (src.inference_backend), exported on first
+    use; PyTorch is used instead, with a warning, when the export cannot be
+    made or fails its parity check.
+    """
+    def load_torch():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_path)
+
+    path = Path(model_path)
+    key = ("sentence_transformer", str(path.resolve()) if path.exists() else model_path, backend)
+    with _lock:
+        if key not in _models:
+            model = None
+            if backend != "torch":
+                from src.inference_backend import load_exported
+                try:
+                    model = load_exported(model_path, backend, load_torch)
+                except (ImportError, OSError, RuntimeError, ValueError) as e:
+                    print(f"⚠️ {backend} backend unavailable ({type(e).__name__}: {e}); using PyTorch")
+            _models[key] = model if model is not None else load_torch()
+        return _models[key]
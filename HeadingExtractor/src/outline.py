@@ -0,0 +1,29 @@
+from typing import Dict
+
+from src.extract_text import extract_text_lines_with_dominant_font, group_lines_by_font_style, save_chunks_to_json
+from src.sanitization import analyze_text_lengths
+from src.classify import classify_document_hierarchical
+from src import tracing
+
+
+def extract_outline(pdf_path: str, output_path: str, base_path: str = 'embeddings', model=None,
+                    backend: str = 'torch', extract_backend: str = 'pdfminer', extract_workers: int = 1) -> Dict:
+    """
+    Runs the full outline pipeline for one PDF: font extraction, grouping,
+    text-length selection and hierarchical classification.
+    """
+    with tracing.span("extract", backend=extract_backend, workers=extract_workers):
+        extracted_lines = extract_text_lines_with_dominant_font(pdf_path, backend=extract_backend,
+                                                                workers=extract_workers)
+    with tracing.span("group"):
+        font_chunks = group_lines_by_font_style(extracted_lines)
+        json_data = save_chunks_to_json(font_chunks)
+    with tracing.span("select"):
+        selected_groups = analyze_text_lengths(json_data)
+    with tracing.span("classify"):
+        return classify_document_hierarchical(
+            selected_groups,
+            base_path=base_path,
+            output_file=output_path,
+            model=model,
+            backend=backend)
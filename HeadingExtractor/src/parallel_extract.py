@@ -0,0 +1,106 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Tuple
+
+from src.extract_text import PageLines, extract_per_page, iter_page_lines, page_count
+
+# Pages per shard at least; shorter PDFs are extracted in this process
+MIN_PAGES_PER_SHARD = 8
+# Shards per worker, so a worker that drew slow pages does not hold up the others
+SHARDS_PER_WORKER = 4
+# Workers are started with "spawn": PDFs are extracted after torch and MiniLM are loaded
+# and their threads run, and forking then can deadlock and copies the model into workers
+_CONTEXT = multiprocessing.get_context("spawn")
+# One pool, kept across PDFs so spawned workers pay their imports once
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def page_shards(pages: int, workers: int) -> List[Tuple[int, int]]:
+    """Contiguous (first, last) page ranges of near-equal size covering all pages"""
+    n = max(1, min(workers * SHARDS_PER_WORKER, pages // MIN_PAGES_PER_SHARD))
+    bounds = [round(i * pages / n) for i in range(n + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _extract_shard(pdf_path: str, backend: str, first: int, last: int) -> List[PageLines]:
+    """Worker: the lines of pages first to last (exclusive); page errors are returned, not raised"""
+    return list(iter_page_lines(pdf_path, backend, first, last))
+
+
+def extract_pages_parallel(pdf_path: str, backend: str = "pdfminer", workers: int = 2) -> Iterator[PageLines]:
+    """(page, lines, error) for every page, extracted across a process pool and yielded in page order.
+
+    Each worker opens the PDF itself and extracts a contiguous page range, so
+    no layout objects cross process boundaries, only the words of each line.
+    A page that raises is reported with its error. A shard that raises as a
+    whole (e.g. on a broken page tree) is retried one page at a time, so only
+    the pages that still fail are lost. A page that crashes its worker
+    outright (e.g. inside the PDF library) is found by retrying its shard one
+    page at a time in the pool, and is reported as failed. The pool is
+    started on first use and reused by later calls; close_pool() stops it.
+    """
+    shards = page_shards(page_count(pdf_path, backend), workers)
+    if len(shards) == 1:
+        yield from iter_page_lines(pdf_path, backend)
+        return
+
+    workers = min(workers, len(shards))
+    pool = _get_pool(workers)
+    futures = [pool.submit(_extract_shard, pdf_path, backend, first, last) for first, last in shards]
+    try:
+        for i, (first, last) in enumerate(shards):
+            try:
+                pages = futures[i].result()
+            except BrokenProcessPool:
+                # The crash took the pool down with every shard still queued: isolate
+                # the culprit page, then resubmit the remaining shards to a fresh pool
+                pages = _run_isolated(pdf_path, backend, first, last, workers, broken=pool)
+                pool = _get_pool(workers)
+                futures[i + 1:] = [pool.submit(_extract_shard, pdf_path, backend, f, l) for f, l in shards[i + 1:]]
+            except Exception:
+                pages = extract_per_page(pdf_path, backend, first, last)
+            yield from pages
+    finally:
+        # Stopped early: drop this PDF's queued shards but keep the pool for the next
+        for future in futures:
+            future.cancel()
+
+
+def _get_pool(workers: int, broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """The shared pool, (re)started when it has a different size or is the broken one given"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool is broken or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_CONTEXT)
+            _pool_workers = workers
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _run_isolated(pdf_path: str, backend: str, first: int, last: int, workers: int,
+                  broken: ProcessPoolExecutor) -> List[PageLines]:
+    """Pages first to last submitted to a fresh pool one at a time, so a crash is pinned on its page"""
+    pages = []
+    pool = _get_pool(workers, broken=broken)
+    for page_num in range(first, last):
+        try:
+            pages.extend(pool.submit(_extract_shard, pdf_path, backend, page_num, page_num + 1).result())
+        except BrokenProcessPool:
+            pages.append((page_num, [], "worker process crashed"))
+            pool = _get_pool(workers, broken=pool)
+        except Exception as e:
+            pages.append((page_num, [], f"{type(e).__name__}: {e}"))
+    return pages
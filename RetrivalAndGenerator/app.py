@@ -1,73 +1,341 @@
+import argparse
+import os
 from pathlib import Path
 
 # Step modules
 from scripts.input_loader import traverse_and_load_inputs
-from scripts.parse_pdf import parse_pdf_to_pages
-from scripts.chunk_text import chunk_pdf_pages
+from scripts.parallel_parse import close_pool, parse_and_chunk_pdfs
 from scripts.embedder import MiniLMEmbedder
+from scripts.model_paths import DEFAULT_MODEL_PATH
+from scripts.embedding_cache import model_fingerprint
+from scripts.corpus_store import CorpusStore
+from scripts.dedup import DedupEncoder, DedupedChunks, SelectedRows, duplicate_groups
 from scripts.searcher import SemanticSearcher
+from scripts.vector_index import build_ivf_lists
 from scripts.prioritizer import prioritize_chunks
 from scripts.llm_generator import TinyLlamaGenerator
 from scripts.output_formatter import write_output_json
+from scripts.pipeline import Stage, run_pipeline
+from scripts import tracing
 job_to_be_done=None
-def process_single_collection(collection_dir: Path, input_json: dict, pdf_paths: list[Path]):
-    print(f"\n🔍 Processing: {collection_dir.name}")
-
-    # 1. Parse & Chunk
-    all_chunks = []
-    for pdf_path in pdf_paths:
-        print(pdf_path)
-        pages = parse_pdf_to_pages(pdf_path)
-        chunks = chunk_pdf_pages(pages)
-        all_chunks.extend(chunks)
-    print(f"🔹 Total parsed chunks: {len(all_chunks)}")
-    # 2. Embed Chunks
-    embedder = MiniLMEmbedder()
-    embedded_chunks = embedder.embed_chunks(all_chunks)
-
-    # 3. Semantic Search
-    searcher = SemanticSearcher(embedded_chunks)
-    query = input_json["job_to_be_done"]["task"]
-    # job_to_be_done=query
-    raw_results = searcher.search(query, top_k=25)  # expand for more coverage
-
-    # 4. Prioritize per PDF
-    top_chunks = prioritize_chunks(raw_results, top_k_per_pdf=3)
-
-    # 5. Generate Answer using LLM
-    llama = TinyLlamaGenerator()
-    role = input_json["persona"]["role"]
+# Processes used to parse and chunk PDFs; defaults to one per core
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+# MiniLM inference backend: "torch", or an exported "onnx" (int8) / "torchscript" copy
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+# Chunks embedded and written to the corpus store per batch; bounds peak memory
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 256))
+# Padded tokens per model batch; chunks of similar length are batched together up to this size
+EMBED_TOKEN_BUDGET = int(os.environ.get("EMBED_TOKEN_BUDGET", 4096))
+# Processes encoding batches, one core each; 1 encodes in this process
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", 1))
+# Independent TinyLlama contexts decoding per-PDF answers in parallel
+LLM_INSTANCES = int(os.environ.get("LLM_INSTANCES", 1))
+# Fixed sampling seed for reproducible answers; unset keeps sampling random
+LLM_SEED = int(os.environ["LLM_SEED"]) if os.environ.get("LLM_SEED") else None
+# Vector index backend: "exact", "ivf", or the quantized "int8" / "binary" (rescored from the store)
+SEARCH_INDEX = os.environ.get("SEARCH_INDEX", "exact")
+# "bm25" scores only lexical candidates densely; unset searches every chunk
+SEARCH_PREFILTER = os.environ.get("SEARCH_PREFILTER") or None
+# Encode verbatim repeats once and collapse duplicate chunks (same or nearly the same text) at search time; 0 keeps every copy
+DEDUP = os.environ.get("DEDUP", "1") != "0"
+# Estimated Jaccard similarity of word 3-shingles from which two chunks count as duplicates
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+# Overlap index/search/generate across collections; 0 runs collections one after another
+PIPELINE_OVERLAP = os.environ.get("PIPELINE_OVERLAP", "1") != "0"
+# Collections allowed to wait between two stages
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 1))
+def load_embedder() -> MiniLMEmbedder:
+    """MiniLM with the EMBED_* backend, batching and worker settings"""
+    return MiniLMEmbedder(backend=EMBED_BACKEND, token_budget=EMBED_TOKEN_BUDGET, workers=EMBED_WORKERS)
+
+def build_corpus(collection_dir: Path, pdf_paths: list[Path], embedder: MiniLMEmbedder) -> CorpusStore:
+    """Parse, chunk and embed only PDFs that are new or changed since the last run"""
+    store = CorpusStore(collection_dir / ".corpus", model_id=model_fingerprint(embedder.model_path, embedder.backend))
+    tracer = tracing.current()
+
+    def chunk_pdfs(paths: list[Path]):
+        tracing.log(f"📄 Parsing {len(paths)} PDFs with {min(PARSE_WORKERS, len(paths))} workers")
+        # Time this thread spends waiting on parsed PDFs, then on lazily produced chunks;
+        # with a process pool the parsing itself happens in the workers
+        return (
+            None if chunks is None else tracer.timed_iter("chunk", chunks, counter="chunks")
+            for chunks in tracer.timed_iter("parse", parse_and_chunk_pdfs(paths, workers=PARSE_WORKERS))
+        )
+
+    encode_texts = lambda texts: embedder.encode_texts(texts, show_progress_bar=False)
+    if DEDUP:
+        # A chunk repeated verbatim in this sync (e.g. the same page in two PDFs) reuses the
+        # first copy's vector; near duplicates are encoded and only collapsed at search time
+        encode_texts = DedupEncoder(encode_texts)
+
+    def encode(texts: list[str]):
+        with tracing.span("embed", chunks=len(texts)):
+            return encode_texts(texts)
+
+    # Chunks are embedded in fixed-size batches and written straight to the store
+    cache_before = embedder.cache.stats() if embedder.cache is not None else None
+    encode_before = embedder.stats()
+    stats = store.sync(
+        pdf_paths,
+        chunk_pdfs=chunk_pdfs,
+        encode=encode,
+        batch_size=EMBED_BATCH_SIZE,
+    )
+    for key, value in stats.items():
+        tracing.count(f"pdfs_{key}", value)
+    tracing.count("indexed_chunks", len(store))
+    tracing.log(f"🔹 Corpus: {stats['added']} added, {stats['changed']} changed, "
+                f"{stats['removed']} removed, {stats['failed']} failed, {stats['unchanged']} unchanged PDFs")
+    tracing.log(f"🔹 Total indexed chunks: {len(store)}")
+    if DEDUP:
+        tracing.count("duplicate_chunks_reused", encode_texts.reused)
+        tracing.log(f"♻️ Reused vectors for {encode_texts.reused} duplicate chunks")
+    encode_after = embedder.stats()
+    encoded, tokens, padded, seconds = (encode_after[key] - encode_before[key]
+                                        for key in ("chunks", "tokens", "padded_tokens", "seconds"))
+    if encoded:
+        tracing.count("encoded_tokens", tokens)
+        tracing.count("encoded_padded_tokens", padded)
+        tracing.log(f"⚡ Encoded {encoded} chunks at {encoded / max(seconds, 1e-9):.1f} chunks/s, "
+                    f"padding overhead {padded / max(tokens, 1) - 1:.1%}")
+    if cache_before is not None:
+        # The cache is shared by every collection; report this one's share
+        cache_stats = embedder.cache.stats()
+        hits, misses = cache_stats["hits"] - cache_before["hits"], cache_stats["misses"] - cache_before["misses"]
+        tracing.count("embedding_cache_hits", hits)
+        tracing.count("embedding_cache_misses", misses)
+        tracing.log(f"🗃️ Embedding cache: {hits} hits, {misses} misses")
+    return store
+
+def build_searcher(store: CorpusStore) -> SemanticSearcher:
+    """Searcher over the store's chunks, searching one copy of each group of duplicates"""
+    chunks, embeddings = store.chunks, store.embeddings
+    if DEDUP:
+        with tracing.span("dedup", chunks=len(store)):
+            # Grouped once per store generation and saved with it
+            groups = store.sidecar("dedup", {"threshold": DEDUP_THRESHOLD},
+                                   lambda: {"groups": duplicate_groups(store.chunks, DEDUP_THRESHOLD)})["groups"]
+            chunks = DedupedChunks(store.chunks, groups)
+            if len(chunks) < len(store):
+                # Canonical rows are read from the memory map as they are scored, not copied
+                embeddings = SelectedRows(store.embeddings, chunks.rows)
+        tracing.count("duplicate_chunks", len(store) - len(chunks))
+        tracing.log(f"♻️ {len(store) - len(chunks)} duplicate chunks collapsed, {len(chunks)} searched")
+    index_params = {}
+    if SEARCH_INDEX == "ivf":
+        # Trained once per store generation and saved with it, rows grouped by list as float16
+        with tracing.span("ivf", chunks=len(chunks)):
+            index_params["lists"] = store.sidecar("ivf", {"dedup": DEDUP_THRESHOLD if DEDUP else None},
+                                                  lambda: build_ivf_lists(embeddings))
+    return SemanticSearcher(chunks, embeddings=embeddings, normalized=True, index=SEARCH_INDEX,
+                            index_params=index_params, prefilter=SEARCH_PREFILTER, backend=EMBED_BACKEND)
+
+def generate_answers(llama: TinyLlamaGenerator, role: str, query: str, top_chunks: dict,
+                     query_vector=None) -> dict:
+    """One persona-aware answer per PDF from its prioritized chunks, decoded concurrently"""
+    # Callbacks run on the generator's worker threads, so bind the caller's tracer now
+    tracer = tracing.current()
+
+    def report(pdf_name: str):
+        def on_metrics(metrics: dict):
+            if metrics["cached"]:
+                tracer.count("response_cache_hits")
+                return
+            tracer.count("response_cache_misses")
+            tracer.count("prompt_tokens", metrics["prompt_tokens"])
+            tracer.count("completion_tokens", metrics["completion_tokens"])
+            tracer.log(f"⏱️ {pdf_name}: first token {metrics['ttft_s']:.2f}s, "
+                       f"{metrics['tokens_per_s']:.1f} tok/s, {metrics['prompt_tokens']} prompt + "
+                       f"{metrics['completion_tokens']} completion tokens", pdf=pdf_name, **metrics)
+        return on_metrics
 
-    refined_outputs = {
-        pdf_name: llama.generate_response(
+    futures = {
+        pdf_name: llama.submit(
             role=role,
             task=query,
-            chunks=chunks
+            chunks=chunks,
+            query_vector=query_vector,
+            on_metrics=report(pdf_name)
         )
         for pdf_name, chunks in top_chunks.items()
     }
+    return {pdf_name: future.result() for pdf_name, future in futures.items()}
 
-    # 6. Save Final Output
-    write_output_json(
-        collection_dir=collection_dir,
-        metadata={
-        **input_json["challenge_info"],
-        **input_json["job_to_be_done"],
-        **input_json["persona"]
-    },
-        top_chunks=top_chunks,
-        refined_outputs=refined_outputs
-    )
+def index_collection(job: dict, embedder: MiniLMEmbedder) -> dict:
+    """Stage 1-2: Parse, Chunk & Embed into the collection's corpus store"""
+    with tracing.use_tracer(job["tracer"]), tracing.span("index", pdfs=len(job["pdf_paths"])):
+        tracing.log(f"\n🔍 Processing: {job['collection_dir'].name}")
+        job["store"] = build_corpus(job["collection_dir"], job["pdf_paths"], embedder)
+    return job
 
-def main():
-    print("📂 Scanning input directory...\n")
-    collections = traverse_and_load_inputs()
+def search_collection(job: dict) -> dict:
+    """Stage 3-4: Semantic Search over the memory-mapped store, then prioritize per PDF"""
+    store = job["store"]
+    query = job["input_json"]["job_to_be_done"]["task"]
+    with tracing.use_tracer(job["tracer"]):
+        with tracing.span("search", index=SEARCH_INDEX, prefilter=SEARCH_PREFILTER):
+            searcher = build_searcher(store)
+            # Keep the query vector; context packing reuses it to rank sentences
+            query_vector = searcher.encode_queries([query])
+            raw_results = searcher.search_vectors(query_vector, top_k=25, queries=[query])[0]  # expand for more coverage
+        with tracing.span("prioritize"):
+            job["query"], job["query_vector"] = query, query_vector[0]
+            job["top_chunks"] = prioritize_chunks(raw_results, top_k_per_pdf=3)
+    return job
 
+def generate_collection(job: dict, llama: TinyLlamaGenerator) -> dict:
+    """Stage 5-6: Generate Answer using LLM and save the final output"""
+    input_json = job["input_json"]
+    role = input_json["persona"]["role"]
+    tracer = job["tracer"]
+
+    with tracing.use_tracer(tracer):
+        # The cache is shared by every collection; report this one's share
+        cache_before = llama.cache.stats() if llama.cache is not None else None
+        with tracing.span("generate", pdfs=len(job["top_chunks"])):
+            refined_outputs = generate_answers(llama, role, job["query"], job["top_chunks"],
+                                               query_vector=job["query_vector"])
+        if cache_before is not None:
+            cache_stats = llama.cache.stats()
+            hits, misses = cache_stats["hits"] - cache_before["hits"], cache_stats["misses"] - cache_before["misses"]
+            tracing.count("response_cache_hits", hits)
+            tracing.count("response_cache_misses", misses)
+            tracing.log(f"🗃️ Response cache: {hits} hits, {misses} misses")
+
+        with tracing.span("write"):
+            write_output_json(
+                collection_dir=job["collection_dir"],
+                metadata={
+                **input_json["challenge_info"],
+                **input_json["job_to_be_done"],
+                **input_json["persona"]
+            },
+                top_chunks=job["top_chunks"],
+                refined_outputs=refined_outputs
+            )
+        tracing.export_from_env(tracer)
+        tracing.log(f"📊 {tracer.summary()}")
+    return job
+
+def process_single_collection(collection_dir: Path, input_json: dict, pdf_paths: list[Path],
+                              llama: TinyLlamaGenerator = None, embedder: MiniLMEmbedder = None):
+    if embedder is None:
+        embedder = load_embedder()
+    if llama is None:
+        llama = TinyLlamaGenerator(n_instances=LLM_INSTANCES, seed=LLM_SEED, embedder=embedder)
+    job = {"collection_dir": collection_dir, "input_json": input_json, "pdf_paths": pdf_paths,
+           "tracer": tracing.tracer_from_env(collection_dir.name)}
+    generate_collection(search_collection(index_collection(job, embedder)), llama)
+
+def run_collections(collections: list):
+    """Index, search and generate answers for every collection"""
+    # One generator for the whole batch so saved persona/task KV states carry across collections
+    embedder = load_embedder()
+    llama = TinyLlamaGenerator(n_instances=LLM_INSTANCES, seed=LLM_SEED, embedder=embedder)
+    if not PIPELINE_OVERLAP:
+        for collection_dir, input_json, pdf_paths in collections:
+            process_single_collection(collection_dir, input_json, pdf_paths, llama=llama, embedder=embedder)
+        return
+
+    # Collections move through the stages independently: while one is generating,
+    # the next can already be indexed and searched
+    jobs = [
+        {"collection_dir": collection_dir, "input_json": input_json, "pdf_paths": pdf_paths,
+         "tracer": tracing.tracer_from_env(collection_dir.name)}
+        for collection_dir, input_json, pdf_paths in collections
+    ]
+    results, timings = run_pipeline(jobs, [
+        Stage("index", lambda job: index_collection(job, embedder)),
+        Stage("search", search_collection),
+        Stage("generate", lambda job: generate_collection(job, llama)),
+    ], queue_size=PIPELINE_QUEUE_SIZE)
+
+    stage_times = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items() if name != "wall_s")
+    tracing.log(f"\n⏱️ Pipeline wall time {timings['wall_s']:.1f}s (busy: {stage_times})")
+    failed = [r for r in results if r.error is not None]
+    for result in failed:
+        tracing.log(f"❌ {result.item['collection_dir'].name} failed in {result.failed_stage}: "
+                    f"{type(result.error).__name__}: {result.error}")
+        tracing.export_from_env(result.item["tracer"])  # partial trace up to the failing stage
+    if failed:
+        raise SystemExit(1)
+
+def index_only(collections: list):
+    """Bring each collection's corpus store up to date; TinyLlama is never loaded"""
+    embedder = load_embedder()
     for collection_dir, input_json, pdf_paths in collections:
-        print(pdf_paths)
-        process_single_collection(collection_dir, input_json, pdf_paths)
+        tracer = tracing.tracer_from_env(collection_dir.name)
+        index_collection({"collection_dir": collection_dir, "input_json": input_json, "pdf_paths": pdf_paths,
+                          "tracer": tracer}, embedder)
+        tracing.export_from_env(tracer)
 
-    print("\n✅ All collections processed!")
+def parse_only(collections: list):
+    """Parse and chunk every PDF and report the counts; no model is loaded and nothing is written"""
+    failed = 0
+    for collection_dir, _, pdf_paths in collections:
+        print(f"\n🔍 Parsing: {collection_dir.name}")
+        for path, chunks in zip(pdf_paths, parse_and_chunk_pdfs(pdf_paths, workers=PARSE_WORKERS)):
+            try:
+                chunks = list(chunks) if chunks is not None else None
+            except Exception as e:  # a single worker parses lazily, so errors surface here
+                print(f"⚠️ Skipping {path.name}: {type(e).__name__}: {e}")
+                chunks = None
+            if chunks is None:
+                failed += 1
+                continue
+            pages = len({chunk["page_number"] for chunk in chunks})
+            chars = sum(len(chunk["chunk_text"]) for chunk in chunks)
+            print(f"📄 {path.name}: {pages} pages with text, {len(chunks)} chunks, {chars} characters")
+    if failed:
+        raise SystemExit(1)
+
+def dry_run(collections: list):
+    """Show what a run would do from file metadata alone: no parsing, no models"""
+    model_id = model_fingerprint(DEFAULT_MODEL_PATH, EMBED_BACKEND)
+    for collection_dir, input_json, pdf_paths in collections:
+        listed = [doc["filename"] for doc in input_json.get("documents", [])]
+        found = {path.name for path in pdf_paths}
+        print(f"\n🔍 {collection_dir.name}: {input_json['persona']['role']} / "
+              f"{input_json['job_to_be_done']['task']}")
+        for filename in listed:
+            if filename not in found:
+                print(f"⚠️ Missing PDF: {filename}")
+        plan = CorpusStore(collection_dir / ".corpus", model_id=model_id).plan(pdf_paths)
+        print(f"🔹 Corpus: {len(plan['added'])} to add, {len(plan['changed'])} changed, "
+              f"{len(plan['removed'])} to remove, {len(plan['unchanged'])} unchanged PDFs")
+        for state in ("added", "changed", "removed"):
+            for name in plan[state]:
+                print(f"   {state}: {name}")
+    if not os.path.exists(DEFAULT_MODEL_PATH):
+        print(f"⚠️ Embedding model not found at {DEFAULT_MODEL_PATH}")
+
+COMMANDS = {
+    "run": run_collections,
+    "parse-only": parse_only,
+    "index-only": index_only,
+    "dry-run": dry_run,
+}
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Persona-driven section retrieval and answers over PDF collections")
+    parser.add_argument("--input", default="./input", help="Directory holding the Collection */ folders")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser("run", help="Index, search and generate answers (default)")
+    commands.add_parser("parse-only", help="Parse and chunk PDFs and report counts; loads no models")
+    commands.add_parser("index-only", help="Update the corpus stores; loads MiniLM but not TinyLlama")
+    commands.add_parser("dry-run", help="List collections, missing PDFs and pending index changes; loads nothing")
+    args = parser.parse_args(argv)
+
+    command = args.command or "run"
+    print("📂 Scanning input directory...\n")
+    collections = traverse_and_load_inputs(args.input)
+    if collections:
+        try:
+            COMMANDS[command](collections)
+        finally:
+            close_pool()
+    if command in ("run", "index-only"):
+        print("\n✅ All collections processed!")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+"""Speed and token fit of the native chunker against langchain's RecursiveCharacterTextSplitter.
+
+Run from the RetrivalAndGenerator directory:
+
+    python -m benchmarks.chunking                     # bundled collections
+    python -m benchmarks.chunking --input ./bench_input --repeat 5
+
+Pages are parsed once; chunking is timed on its own (best of --repeat), and
+"import s" is the cost of importing the chunker in a fresh interpreter, which
+every parse worker pays once. Token counts
+use the MiniLM tokenizer from ./models when `tokenizers` can load it, and an
+approximation otherwise. "over limit" is the share of chunks longer than the
+model's max_seq_length, and "truncated" the share of all embedded tokens that
+encode() would silently drop. The langchain row (768 characters, 100 overlap,
+as used before) is skipped when langchain is not installed.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from scripts.chunk_text import get_chunker, load_token_starts, model_max_tokens
+from scripts.input_loader import find_all_collections, get_required_pdfs, load_input_json
+from scripts.parse_pdf import parse_pdf_to_pages
+
+
+def load_pages(input_dir: str) -> List[Dict]:
+    pages = []
+    for collection_dir in sorted(find_all_collections(input_dir)):
+        for path in get_required_pdfs(collection_dir, load_input_json(collection_dir)):
+            pages.extend(parse_pdf_to_pages(path))
+    return pages
+
+
+def native_chunks(pages: List[Dict]) -> List[str]:
+    chunker = get_chunker()
+    return [page["text"][start:end] for page in pages for start, end in chunker.split(page["text"])]
+
+
+def langchain_splitter() -> Callable[[List[Dict]], List[str]]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=768, chunk_overlap=100,
+                                              separators=["\n\n", "\n", ".", "?", "!", ""])
+    return lambda pages: [chunk for page in pages for chunk in splitter.split_text(page["text"])]
+
+
+def import_seconds(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(result.stdout) if result.returncode == 0 else float("nan")
+
+
+def measure(name: str, chunk: Callable[[List[Dict]], List[str]], pages: List[Dict], repeat: int,
+            token_starts: Callable[[str], List[int]], max_tokens: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = chunk(pages)
+        best = min(best, time.perf_counter() - start)
+    counts = [len(token_starts(text)) for text in chunks]
+    total = sum(counts)
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "seconds": best,
+        "mb_per_s": sum(len(page["text"]) for page in pages) / best / 1e6,
+        "mean_tokens": total / max(len(counts), 1),
+        "max_tokens": max(counts, default=0),
+        "over_limit": sum(c > max_tokens for c in counts) / max(len(counts), 1),
+        "truncated": sum(max(c - max_tokens, 0) for c in counts) / max(total, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="./input")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.input)
+    token_starts, max_tokens = load_token_starts(), model_max_tokens()
+    chunkers: List[Tuple[str, Callable]] = [("native", native_chunks)]
+    try:
+        chunkers.append(("langchain", langchain_splitter()))
+    except ImportError:
+        print("⚠️ langchain is not installed; timing the native chunker only")
+
+    rows = [measure(name, chunk, pages, args.repeat, token_starts, max_tokens) for name, chunk in chunkers]
+    modules = {"native": "scripts.chunk_text", "langchain": "langchain.text_splitter"}
+    for row in rows:
+        row["import_s"] = import_seconds(modules[row["chunker"]])
+    print(f"{len(pages)} pages, limit {max_tokens} tokens")
+    print(f"{'chunker':<10} {'chunks':>7} {'seconds':>8} {'MB/s':>6} {'import s':>9} {'mean tok':>9} "
+          f"{'max tok':>8} {'over limit':>11} {'truncated':>10}")
+    for row in rows:
+        print(f"{row['chunker']:<10} {row['chunks']:>7} {row['seconds']:>8.3f} {row['mb_per_s']:>6.1f} "
+              f"{row['import_s']:>9.3f} {row['mean_tokens']:>9.1f} {row['max_tokens']:>8} "
+              f"{row['over_limit']:>11.1%} {row['truncated']:>10.1%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
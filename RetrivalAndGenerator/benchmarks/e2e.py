@@ -0,0 +1,289 @@
+"""End-to-end benchmark: per-stage timings and peak memory on synthetic PDF collections.
+
+Run from the RetrivalAndGenerator directory:
+
+    python -m benchmarks.e2e --sizes 2x4 8x8                 # tiny stand-in models (CI)
+    python -m benchmarks.e2e --sizes 6x10 --real-models      # MiniLM and TinyLlama from ./models
+    python -m benchmarks.e2e --save-baseline                 # record benchmarks/baseline.json
+    python -m benchmarks.e2e --baseline benchmarks/baseline.json --tolerance 0.25
+
+A size "PxN" is P PDFs of N pages. The RAG pipeline runs as app.py runs a
+collection: index_collection (corpus store, dedup, parallel parsing and the
+EMBED_* / SEARCH_* / DEDUP settings from the environment), search_collection
+and generate_collection, with the embedding and response caches off and a
+fresh store every run. Those three stages report wall and CPU seconds and their
+peak Python heap (tracemalloc, which also tracks numpy buffers); the spans the
+app traces inside them (parse, chunk, embed, dedup, search, prioritize, write,
+...) report wall and CPU seconds. HeadingExtractor is timed per PDF (extract,
+group, classify) and skipped with a message when it cannot be imported (it
+needs torch). Every result records the process peak RSS so far.
+
+Baselines are machine-specific and not committed: record one with
+--save-baseline first. With --baseline, any stage slower or larger than
+baseline * (1 + tolerance) is listed and the exit code is 1; a missing
+baseline file is reported and the comparison skipped.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.stand_in_models import EchoLlama, HashingEncoder
+from benchmarks.synthetic_pdfs import generate_collection
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+# Differences below these are noise, whatever the ratio
+MIN_DELTA_S = 0.02
+MIN_DELTA_MB = 1.0
+
+
+class StageTimer:
+    """Accumulates wall time, CPU time and peak traced memory per named stage"""
+
+    def __init__(self, quiet: bool = True):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.quiet = quiet
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        # The pipeline prints progress for every step; keep benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext():
+            yield
+        stats = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_mb": 0.0})
+        stats["wall_s"] += time.perf_counter() - wall
+        stats["cpu_s"] += time.process_time() - cpu
+        stats["peak_mb"] = max(stats["peak_mb"], (tracemalloc.get_traced_memory()[1] - base) / 2**20)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def use_stand_in_models():
+    from scripts.model_registry import override_loader
+    override_loader("sentence_transformer", lambda model_path: HashingEncoder(model_path))
+    override_loader("llama", lambda model_path, **settings: EchoLlama(model_path, **settings))
+
+
+def bench_rag(collection_dir: Path, timer: StageTimer) -> Dict:
+    import app
+    from scripts import tracing
+    from scripts.embedder import MiniLMEmbedder
+    from scripts.input_loader import get_required_pdfs, load_input_json
+    from scripts.llm_generator import TinyLlamaGenerator
+
+    input_json = load_input_json(collection_dir)
+    pdf_paths = get_required_pdfs(collection_dir, input_json)
+    # Load models before timing so stages measure steady-state work; caches off and a
+    # fresh corpus store so every run does it all
+    embedder = MiniLMEmbedder(cache_dir=None, backend=app.EMBED_BACKEND, token_budget=app.EMBED_TOKEN_BUDGET,
+                              workers=app.EMBED_WORKERS)
+    llama = TinyLlamaGenerator(cache_dir=None, n_instances=app.LLM_INSTANCES, seed=0, embedder=embedder)
+    shutil.rmtree(collection_dir / ".corpus", ignore_errors=True)
+    tracer = tracing.Tracer(collection_dir.name, echo=False)
+    job = {"collection_dir": collection_dir, "input_json": input_json, "pdf_paths": pdf_paths, "tracer": tracer}
+
+    with timer.stage("index"):
+        app.index_collection(job, embedder)
+    with timer.stage("search"):
+        app.search_collection(job)
+    with timer.stage("generate"):
+        app.generate_collection(job, llama)
+    llama.shutdown()
+    embedder.close()
+    # Spans traced inside the three stages, by wall and CPU time only
+    for name, totals in tracer.stage_totals().items():
+        if name not in timer.stages:
+            timer.stages[name] = {"wall_s": totals["wall_s"], "cpu_s": totals["cpu_s"]}
+    return {"pdfs": len(pdf_paths), "chunks": len(job["store"])}
+
+
+def load_heading_extractor(heading_extractor_dir: Path) -> Dict:
+    """HeadingExtractor's stage functions; raises ImportError when it or a dependency is missing"""
+    if str(heading_extractor_dir) not in sys.path:
+        sys.path.append(str(heading_extractor_dir))
+    import torch  # noqa: F401 -- classify imports it on first call, even with stand-in models
+    from src.classify import classify_document_hierarchical
+    from src.extract_text import extract_text_lines_with_dominant_font, group_lines_by_font_style, save_chunks_to_json
+    from src.model_registry import get_sentence_transformer
+    from src.sanitization import analyze_text_lengths
+    return {"classify_document_hierarchical": classify_document_hierarchical,
+            "extract_text_lines_with_dominant_font": extract_text_lines_with_dominant_font,
+            "group_lines_by_font_style": group_lines_by_font_style, "save_chunks_to_json": save_chunks_to_json,
+            "get_sentence_transformer": get_sentence_transformer, "analyze_text_lengths": analyze_text_lengths}
+
+
+def bench_heading_extractor(collection_dir: Path, heading_extractor_dir: Path, real_models: bool,
+                            timer: StageTimer) -> Dict:
+    he = load_heading_extractor(heading_extractor_dir)
+    classify_document_hierarchical = he["classify_document_hierarchical"]
+    extract_text_lines_with_dominant_font = he["extract_text_lines_with_dominant_font"]
+    group_lines_by_font_style, save_chunks_to_json = he["group_lines_by_font_style"], he["save_chunks_to_json"]
+    get_sentence_transformer, analyze_text_lengths = he["get_sentence_transformer"], he["analyze_text_lengths"]
+
+    model = get_sentence_transformer(str(heading_extractor_dir / "all-MiniLM-L12-v2")) if real_models \
+        else HashingEncoder()
+    pdf_paths = sorted((collection_dir / "PDFs").glob("*.pdf"))
+    lines = 0
+    with tempfile.TemporaryDirectory() as out_dir:
+        for path in pdf_paths:
+            with timer.stage("extract"):
+                extracted = extract_text_lines_with_dominant_font(str(path))
+            with timer.stage("group"):
+                selected = analyze_text_lengths(save_chunks_to_json(group_lines_by_font_style(extracted)))
+            with timer.stage("classify"):
+                classify_document_hierarchical(selected, base_path=str(heading_extractor_dir / "embeddings"),
+                                               output_file=str(Path(out_dir) / f"{path.stem}.json"), model=model)
+            lines += len(extracted)
+    return {"pdfs": len(pdf_paths), "lines": lines}
+
+
+def merge_runs(runs: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Fastest wall/CPU time and largest peak (where measured) per stage over repeated runs"""
+    merged = {}
+    for name in runs[0]:
+        merged[name] = {
+            "wall_s": min(r[name]["wall_s"] for r in runs),
+            "cpu_s": min(r[name]["cpu_s"] for r in runs),
+        }
+        if "peak_mb" in runs[0][name]:
+            merged[name]["peak_mb"] = max(r[name]["peak_mb"] for r in runs)
+    return merged
+
+
+def run(sizes: List[str], repeat: int, real_models: bool, heading_extractor_dir: Optional[Path],
+        seed: int) -> List[Dict]:
+    from scripts.parallel_parse import close_pool
+
+    apps = ["rag"] + (["heading_extractor"] if heading_extractor_dir else [])
+    results = []
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            n_pdfs, pages = (int(x) for x in size.lower().split("x"))
+            collection_dir = Path(work_dir) / f"Collection {size}"
+            corpus = generate_collection(collection_dir, n_pdfs=n_pdfs, pages=pages, seed=seed)
+            for app in apps:
+                runs, counts = [], {}
+                for _ in range(repeat):
+                    timer = StageTimer()
+                    if app == "rag":
+                        counts = bench_rag(collection_dir, timer)
+                    else:
+                        counts = bench_heading_extractor(collection_dir, heading_extractor_dir, real_models, timer)
+                    runs.append(timer.stages)
+                stages = merge_runs(runs)
+                results.append({
+                    "app": app,
+                    "size": size,
+                    **counts,
+                    "words": corpus["words"],
+                    "stages": stages,
+                    # The app's traced spans run inside its measured stages; only those add up
+                    "total_s": sum(s["wall_s"] for s in stages.values() if "peak_mb" in s),
+                    "peak_rss_mb": peak_rss_mb(),
+                })
+    tracemalloc.stop()
+    close_pool()
+    return results
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Human-readable regressions of results against a stored baseline"""
+    base_rows = {(r["app"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for row in results:
+        base = base_rows.get((row["app"], row["size"]))
+        if base is None:
+            continue
+        for name, stats in row["stages"].items():
+            old = base["stages"].get(name)
+            if old is None:
+                continue
+            for metric, min_delta in (("wall_s", MIN_DELTA_S), ("peak_mb", MIN_DELTA_MB)):
+                if metric not in stats or metric not in old:
+                    continue
+                if stats[metric] > old[metric] * (1 + tolerance) and stats[metric] - old[metric] > min_delta:
+                    regressions.append(f"{row['app']} {row['size']} {name}: {metric} "
+                                       f"{old[metric]:.3f} -> {stats[metric]:.3f} "
+                                       f"(+{(stats[metric] / max(old[metric], 1e-9) - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["2x4", "8x8"], help="PDFSxPAGES per collection")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the fastest is kept")
+    parser.add_argument("--real-models", action="store_true", help="Use MiniLM and TinyLlama instead of stand-ins")
+    parser.add_argument("--heading-extractor", default="../HeadingExtractor",
+                        help="HeadingExtractor checkout to benchmark; empty string to skip it")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE),
+                        help=f"Store results as the baseline (default {DEFAULT_BASELINE.name})")
+    args = parser.parse_args()
+
+    if not args.real_models:
+        use_stand_in_models()
+    heading_extractor_dir = Path(args.heading_extractor).resolve() if args.heading_extractor else None
+    if heading_extractor_dir:
+        try:
+            load_heading_extractor(heading_extractor_dir)
+        except ImportError as e:
+            print(f"⚠️ Skipping HeadingExtractor: {e}")
+            heading_extractor_dir = None
+    results = run(args.sizes, args.repeat, args.real_models, heading_extractor_dir, args.seed)
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "models": "real" if args.real_models else "stand-in", "repeat": args.repeat},
+        "results": results,
+    }
+
+    print(f"{'app':<18} {'size':>6} {'stage':<11} {'wall s':>8} {'cpu s':>8} {'peak MB':>8}")
+    for row in results:
+        for name, stats in row["stages"].items():
+            peak = f"{stats['peak_mb']:>8.1f}" if "peak_mb" in stats else f"{'':>8}"
+            print(f"{row['app']:<18} {row['size']:>6} {name:<11} {stats['wall_s']:>8.3f} "
+                  f"{stats['cpu_s']:>8.3f} {peak}")
+        print(f"{row['app']:<18} {row['size']:>6} {'total':<11} {row['total_s']:>8.3f} "
+              f"{'':>8} {row['peak_rss_mb']:>8.1f} (peak RSS)")
+
+    for path in filter(None, [args.json, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {path}")
+
+    if args.baseline and not Path(args.baseline).exists():
+        print(f"⚠️ No baseline at {args.baseline}; record one with --save-baseline")
+    elif args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("models") != report["meta"]["models"]:
+            print(f"⚠️ Baseline used {baseline['meta'].get('models')} models, this run {report['meta']['models']}")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
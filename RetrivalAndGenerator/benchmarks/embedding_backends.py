@@ -0,0 +1,99 @@
+"""Embedding throughput and parity of the MiniLM inference backends (PyTorch, int8 ONNX Runtime, TorchScript).
+
+Run from the RetrivalAndGenerator directory (needs the MiniLM model in ./models):
+
+    python -m benchmarks.embedding_backends                      # one thread: throughput per core
+    python -m benchmarks.embedding_backends --threads 4 --limit 2048
+
+Chunks come from the bundled collections, cut by the app's chunker. Every
+backend encodes the same chunks (best of --repeat after a warm-up batch);
+"mean cos" / "min cos" compare its vectors with PyTorch's for each chunk.
+Exports are made on first use next to the model (see scripts.inference_backend).
+A backend whose dependencies are missing is skipped.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.chunking import load_pages
+from scripts.chunk_text import get_chunker
+from scripts.inference_backend import BACKENDS, export_dir, load_exported
+from scripts.model_paths import DEFAULT_MODEL_PATH
+
+
+def load_texts(input_dir: str, limit: int) -> List[str]:
+    chunker = get_chunker()
+    texts = [page["text"][start:end] for page in load_pages(input_dir) for start, end in chunker.split(page["text"])]
+    return texts[:limit]
+
+
+def measure(name: str, model, texts: List[str], batch_size: int, repeat: int) -> Dict:
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up: lazy init, allocator, caches
+    best, vectors = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - start)
+    return {"backend": name, "seconds": best, "chunks_per_s": len(texts) / best,
+            "vectors": np.asarray(vectors, dtype=np.float32)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--input", default="./input")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--limit", type=int, default=512, help="Chunks to encode")
+    parser.add_argument("--threads", type=int, default=1, help="Inference threads per backend")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(args.threads)
+    texts = load_texts(args.input, args.limit)
+    reference = SentenceTransformer(args.model, device="cpu")
+
+    rows, vectors = [], {}
+    for backend in args.backends:
+        try:
+            model = reference if backend == "torch" else load_exported(
+                args.model, backend, lambda: reference, threads=args.threads)
+        except (ImportError, ValueError, RuntimeError) as e:
+            print(f"⚠️ Skipping {backend}: {type(e).__name__}: {e}")
+            continue
+        row = measure(backend, model, texts, args.batch_size, args.repeat)
+        vectors[backend] = row.pop("vectors")
+        row["chunks_per_s_per_thread"] = row["chunks_per_s"] / args.threads
+        if backend != "torch":
+            with open(export_dir(args.model, backend) / "export.json", "r", encoding="utf-8") as f:
+                row["export_s"] = json.load(f).get("export_s")
+        rows.append(row)
+
+    if "torch" in vectors:
+        torch_row = next(row for row in rows if row["backend"] == "torch")
+        for row in rows:
+            a, b = vectors[row["backend"]], vectors["torch"]
+            cosine = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+            row["speedup"] = row["chunks_per_s"] / torch_row["chunks_per_s"]
+            row["mean_cosine"], row["min_cosine"] = float(cosine.mean()), float(cosine.min())
+
+    print(f"{len(texts)} chunks, {args.threads} thread(s), batch size {args.batch_size}")
+    print(f"{'backend':<12} {'chunks/s':>9} {'per thread':>11} {'speedup':>8} {'mean cos':>9} {'min cos':>8}")
+    for row in rows:
+        print(f"{row['backend']:<12} {row['chunks_per_s']:>9.1f} {row['chunks_per_s_per_thread']:>11.1f} "
+              f"{row.get('speedup', float('nan')):>8.2f} {row.get('mean_cosine', float('nan')):>9.4f} "
+              f"{row.get('min_cosine', float('nan')):>8.4f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
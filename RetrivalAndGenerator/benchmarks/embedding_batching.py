@@ -0,0 +1,96 @@
+"""Throughput and padding of fixed-size batches against length-bucketed, token-budget batches.
+
+Run from the RetrivalAndGenerator directory (needs the MiniLM model in ./models):
+
+    python -m benchmarks.embedding_batching                       # fixed vs bucketed, one process
+    python -m benchmarks.embedding_batching --workers 2 4 --limit 2048
+
+"fixed" encodes the chunks in input order, --batch-size at a time, as the
+embedder did before; "bucketed" is MiniLMEmbedder's batching with
+--token-budget padded tokens per batch, in this process or spread over
+--workers processes pinned to cores. "padding" is the share of encoded
+tokens that are padding. Every mode encodes the same chunks from the bundled
+collections, best of --repeat.
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.embedding_backends import load_texts
+from scripts.batching import padded_tokens
+from scripts.embedder import MiniLMEmbedder
+from scripts.model_paths import DEFAULT_MODEL_PATH
+from scripts.inference_backend import BACKENDS
+
+
+def measure(name: str, encode: Callable[[List[str]], np.ndarray], texts: List[str], repeat: int,
+            tokens: int, padded: int, batches: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(texts)
+        best = min(best, time.perf_counter() - start)
+    return {"mode": name, "seconds": best, "chunks_per_s": len(texts) / best, "batches": batches,
+            "padding_overhead": padded / tokens - 1}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--input", default="./input")
+    parser.add_argument("--limit", type=int, default=512, help="Chunks to encode")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per batch in fixed mode")
+    parser.add_argument("--token-budget", type=int, default=4096)
+    parser.add_argument("--workers", type=int, nargs="*", default=[], help="Process counts to try")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.limit)
+    embedder = MiniLMEmbedder(args.model, cache_dir=None, backend=args.backend, token_budget=args.token_budget)
+    lengths = embedder.token_lengths(texts)
+    model = embedder.model
+
+    def fixed(batch_texts: List[str]) -> np.ndarray:
+        return np.concatenate([model.encode(batch_texts[i:i + args.batch_size], batch_size=args.batch_size,
+                                            convert_to_numpy=True)
+                               for i in range(0, len(batch_texts), args.batch_size)])
+
+    fixed_batches = [np.arange(i, min(i + args.batch_size, len(texts))) for i in range(0, len(texts), args.batch_size)]
+    model.encode(texts[:args.batch_size])  # warm-up
+    rows = [measure("fixed", fixed, texts, args.repeat, *padded_tokens(lengths, fixed_batches), len(fixed_batches))]
+
+    def bucketed(workers: int) -> Dict:
+        runner = MiniLMEmbedder(args.model, cache_dir=None, backend=args.backend, token_budget=args.token_budget,
+                                workers=workers)
+        runner.encode_texts(texts[:args.batch_size * max(workers, 1) * 2])  # warm-up; starts the workers
+        before = runner.stats()
+        row = measure("bucketed" if workers <= 1 else f"bucketed x{workers}", runner.encode_texts, texts,
+                      args.repeat, 1, 1, 0)
+        after = runner.stats()
+        row["batches"] = (after["batches"] - before["batches"]) // args.repeat
+        row["padding_overhead"] = ((after["padded_tokens"] - before["padded_tokens"])
+                                   / (after["tokens"] - before["tokens"]) - 1)
+        runner.close()
+        return row
+
+    rows.append(bucketed(1))
+    rows.extend(bucketed(workers) for workers in args.workers if workers > 1)
+
+    print(f"{len(texts)} chunks, mean {lengths.mean():.0f} tokens, backend {args.backend}")
+    print(f"{'mode':<14} {'chunks/s':>9} {'speedup':>8} {'batches':>8} {'padding':>8}")
+    for row in rows:
+        print(f"{row['mode']:<14} {row['chunks_per_s']:>9.1f} {row['chunks_per_s'] / rows[0]['chunks_per_s']:>8.2f} "
+              f"{row['batches']:>8} {row['padding_overhead']:>8.1%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Parity and speed of HeadingExtractor's text extraction backends (pdfminer.six against PyMuPDF).
+
+Run from the RetrivalAndGenerator directory:
+
+    python -m benchmarks.heading_extraction                      # bundled PDFs of both apps
+    python -m benchmarks.heading_extraction --pdfs some/dir --min-agreement 0.95
+    python -m benchmarks.heading_extraction --synthetic-pages 300 --workers 1 2 4   # page-parallel scaling
+
+Every backend extracts the same PDFs (best of --repeat), once per --workers
+count; with more than one worker, page ranges of each PDF are extracted in
+parallel processes. Its line records are
+compared with pdfminer's: "text" is the share of pdfminer's lines it
+reproduces (same page and text), "style" the share of those with the same
+font name, size and boldness, i.e. that land in the same font group. Exits
+with status 1 when either falls below --min-agreement.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+
+def default_pdfs(heading_extractor_dir: Path) -> List[Path]:
+    return sorted((heading_extractor_dir / "input").glob("*.pdf")) + sorted(Path("input").glob("*/PDFs/*.pdf"))
+
+
+def agreement(reference: List[Dict], candidate: List[Dict]) -> Dict[str, int]:
+    """Lines of reference found in candidate by (page, text), and how many of those share its font style"""
+    by_text = defaultdict(list)
+    for line in candidate:
+        by_text[(line["page"], line["text"])].append(line)
+    matched = same_style = 0
+    for line in reference:
+        found = by_text.get((line["page"], line["text"]))
+        if not found:
+            continue
+        other = found.pop(0)
+        matched += 1
+        style = (line["font_name"], line["font_size"], line["is_bold"])
+        same_style += (other["font_name"], other["font_size"], other["is_bold"]) == style
+    return {"lines": len(reference), "matched": matched, "same_style": same_style}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heading-extractor", default="../HeadingExtractor", help="HeadingExtractor checkout")
+    parser.add_argument("--pdfs", help="Directory of PDFs (default: the bundled inputs of both apps)")
+    parser.add_argument("--synthetic-pages", type=int, help="Extract one generated PDF of this many pages instead")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Extraction process counts to try")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    heading_extractor_dir = Path(args.heading_extractor).resolve()
+    if str(heading_extractor_dir) not in sys.path:
+        sys.path.append(str(heading_extractor_dir))
+    from src.extract_text import EXTRACT_BACKENDS, extract_text_lines_with_dominant_font
+
+    if args.synthetic_pages:
+        from benchmarks.synthetic_pdfs import generate_pdf
+        tmp = tempfile.TemporaryDirectory()
+        pdfs = [Path(tmp.name) / "synthetic.pdf"]
+        generate_pdf(pdfs[0], pages=args.synthetic_pages)
+    else:
+        pdfs = sorted(Path(args.pdfs).glob("*.pdf")) if args.pdfs else default_pdfs(heading_extractor_dir)
+    rows = []
+    for backend in EXTRACT_BACKENDS:
+        for workers in args.workers:
+            seconds, lines = defaultdict(lambda: float("inf")), {}
+            for _ in range(args.repeat):
+                for path in pdfs:
+                    start = time.perf_counter()
+                    lines[path] = extract_text_lines_with_dominant_font(str(path), backend=backend, workers=workers)
+                    seconds[path] = min(seconds[path], time.perf_counter() - start)
+            rows.append({"backend": backend, "workers": workers, "pdfs": len(pdfs), "seconds": sum(seconds.values()),
+                         "lines": sum(len(v) for v in lines.values()), "records": lines})
+
+    reference = rows[0]["records"]
+    for row in rows:
+        totals = Counter()
+        for path, records in row.pop("records").items():
+            totals.update(agreement(reference[path], records))
+        row["speedup"] = rows[0]["seconds"] / row["seconds"]
+        row["text_agreement"] = totals["matched"] / max(totals["lines"], 1)
+        row["style_agreement"] = totals["same_style"] / max(totals["matched"], 1)
+
+    print(f"\n{len(pdfs)} PDFs, best of {args.repeat}")
+    print(f"{'backend':<10} {'workers':>7} {'seconds':>8} {'speedup':>8} {'lines':>7} {'text':>7} {'style':>7}")
+    for row in rows:
+        print(f"{row['backend']:<10} {row['workers']:>7} {row['seconds']:>8.2f} {row['speedup']:>8.2f} {row['lines']:>7} "
+              f"{row['text_agreement']:>7.2%} {row['style_agreement']:>7.2%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if any(min(row["text_agreement"], row["style_agreement"]) < args.min_agreement for row in rows):
+        print(f"❌ Agreement with pdfminer below {args.min_agreement:.0%}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
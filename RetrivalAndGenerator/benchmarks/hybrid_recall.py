@@ -0,0 +1,106 @@
+"""Recall@k and query latency of the BM25 prefilter + dense rerank against pure dense search.
+
+Run from the RetrivalAndGenerator directory (needs the MiniLM model in ./models):
+
+    python -m benchmarks.hybrid_recall --n-candidates 128 512 2048
+
+Each bundled collection is indexed through its corpus store. The queries are
+the collection's task plus short phrases sampled from its own chunks, which
+have the lexical anchors of real queries ("fillable forms", "e-signatures").
+The "fallback" column is the share of queries that matched too few chunks and
+were answered by full dense search.
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from app import build_corpus
+from scripts.embedder import MiniLMEmbedder
+from scripts.input_loader import find_all_collections, get_required_pdfs, load_input_json
+from scripts.searcher import SemanticSearcher
+from scripts.vector_index import recall_at_k
+
+
+def sample_queries(chunks, n: int, seed: int = 0) -> List[str]:
+    """Short word windows taken from random chunks"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for idx in rng.choice(len(chunks), min(n, len(chunks)), replace=False):
+        words = re.findall(r"[A-Za-z][\w-]*", chunks[int(idx)]["chunk_text"])
+        if len(words) < 3:
+            continue
+        size = int(rng.integers(2, min(6, len(words)) + 1))
+        start = int(rng.integers(0, len(words) - size + 1))
+        queries.append(" ".join(words[start:start + size]))
+    return queries
+
+
+def timed_search(searcher: SemanticSearcher, query_matrix: np.ndarray, queries, top_k: int):
+    start = time.perf_counter()
+    if queries is None:
+        _, ids = searcher.index.search(query_matrix, top_k)
+    else:
+        _, ids = searcher._search_prefiltered(query_matrix, queries, top_k)
+    return ids, (time.perf_counter() - start) / len(query_matrix) * 1000
+
+
+def run(name: str, chunks, embeddings: np.ndarray, queries: List[str], top_k: int,
+        n_candidates: List[int], min_candidates: int) -> List[Dict]:
+    start = time.perf_counter()
+    searcher = SemanticSearcher(chunks, embeddings=embeddings, normalized=True, prefilter="bm25",
+                                min_candidates=min_candidates)
+    build_s = time.perf_counter() - start
+    query_matrix = searcher.encode_queries(queries)
+
+    dense_ids, dense_ms = timed_search(searcher, query_matrix, None, top_k)
+    rows = [{"collection": name, "n": len(chunks), "method": "dense", "recall": 1.0,
+             "ms_per_query": dense_ms, "fallback": 0.0}]
+    for limit in n_candidates:
+        searcher.n_candidates = limit
+        ids, ms = timed_search(searcher, query_matrix, queries, top_k)
+        fallback = np.mean([
+            len(searcher.lexical.candidates(q, max(limit, top_k))) < max(min_candidates, top_k) for q in queries
+        ])
+        rows.append({"collection": name, "n": len(chunks), "method": f"bm25({limit})+dense",
+                     "recall": recall_at_k(dense_ids, ids), "ms_per_query": ms,
+                     "fallback": float(fallback), "build_s": build_s})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="./input")
+    parser.add_argument("--queries", type=int, default=200, help="Sampled queries per collection")
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--n-candidates", type=int, nargs="+", default=[128, 512, 2048])
+    parser.add_argument("--min-candidates", type=int, default=50)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    embedder = MiniLMEmbedder()
+    results = []
+    for collection_dir in sorted(find_all_collections(args.input)):
+        input_json = load_input_json(collection_dir)
+        store = build_corpus(collection_dir, get_required_pdfs(collection_dir, input_json), embedder)
+        queries = [input_json["job_to_be_done"]["task"]] + sample_queries(store.chunks, args.queries)
+        results.extend(run(Path(collection_dir).name, store.chunks, store.embeddings, queries, args.top_k,
+                           args.n_candidates, args.min_candidates))
+
+    print(f"{'collection':<14} {'n':>7}  {'method':<18} {'recall@' + str(args.top_k):>10} "
+          f"{'ms/query':>9} {'fallback':>9}")
+    for row in results:
+        print(f"{row['collection']:<14} {row['n']:>7}  {row['method']:<18} {row['recall']:>10.3f} "
+              f"{row['ms_per_query']:>9.3f} {row['fallback']:>9.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Recall@k, query latency and vector memory of the approximate index backends against exact search.
+
+Run from the RetrivalAndGenerator directory:
+
+    python -m benchmarks.index_recall --sizes 10000 50000 200000 --n-probe 1 4 8 16
+
+By default the corpus is synthetic clustered unit vectors; pass --embeddings with a
+saved (n, dim) .npy matrix to benchmark real chunk vectors instead. Queries are
+searched --query-batch at a time (all at once by default; a server request is
+one). "exact(float16)" scans the rows as the corpus store holds them, converting
+them block by block, which is what exact search costs in the app.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from scripts.searcher import normalize_rows
+from scripts.vector_index import ExactIndex, IVFFlatIndex, QuantizedIndex, recall_at_k
+
+
+def synthetic_corpus(n: int, dim: int = 384, n_topics: int = 200, noise: float = 1.0, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random topic centres, roughly like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    topics = rng.integers(0, n_topics, size=n)
+    vectors = centres[topics] + noise * np.sqrt(n_topics / dim) * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+def time_queries(index, queries: np.ndarray, top_k: int, batch: int = None):
+    batch = batch or len(queries)
+    start = time.perf_counter()
+    ids = np.concatenate([index.search(queries[i:i + batch], top_k)[1] for i in range(0, len(queries), batch)])
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def run(corpus: np.ndarray, n_queries: int, top_k: int, n_probes: List[int], n_lists: int = None,
+        batch: int = None) -> List[Dict]:
+    rng = np.random.default_rng(1)
+    # Perturbed corpus rows as queries, so every query has real near neighbours
+    picks = rng.choice(len(corpus), n_queries, replace=False)
+    queries = normalize_rows(corpus[picks] + 0.05 * rng.standard_normal((n_queries, corpus.shape[1])))
+
+    exact = ExactIndex(corpus)
+    exact_ids, exact_ms = time_queries(exact, queries, top_k, batch)
+    rows = [{"n": len(corpus), "backend": "exact", "recall": 1.0, "ms_per_query": exact_ms,
+             "vector_mb": corpus.nbytes / 2**20}]
+    stored = corpus.astype(np.float16)
+    ids, ms = time_queries(ExactIndex(stored), queries, top_k, batch)
+    rows.append({"n": len(corpus), "backend": "exact(float16)", "recall": recall_at_k(exact_ids, ids),
+                 "ms_per_query": ms, "vector_mb": stored.nbytes / 2**20})
+
+    start = time.perf_counter()
+    ivf = IVFFlatIndex(corpus, n_lists=n_lists)
+    build_s = time.perf_counter() - start
+    for n_probe in n_probes:
+        ivf.n_probe = n_probe
+        ids, ms = time_queries(ivf, queries, top_k, batch)
+        rows.append({
+            "n": len(corpus),
+            "backend": f"ivf(n_lists={ivf.n_lists}, n_probe={n_probe})",
+            "recall": recall_at_k(exact_ids, ids),
+            "ms_per_query": ms,
+            "vector_mb": ivf.vectors.nbytes / 2**20,
+            "build_s": build_s,
+        })
+
+    # Quantized first pass; the float32 corpus stands in for the on-disk float16 rows used to rescore
+    for precision in ("int8", "binary"):
+        start = time.perf_counter()
+        quantized = QuantizedIndex(corpus, precision=precision)
+        build_s = time.perf_counter() - start
+        for rescore in (False, True):
+            quantized.rescore = rescore
+            ids, ms = time_queries(quantized, queries, top_k, batch)
+            rows.append({
+                "n": len(corpus),
+                "backend": f"{precision}({'rescored' if rescore else 'approximate'})",
+                "recall": recall_at_k(exact_ids, ids),
+                "ms_per_query": ms,
+                "vector_mb": quantized.quantized.nbytes / 2**20,
+                "build_s": build_s,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--embeddings", help="Benchmark a saved .npy matrix instead of synthetic data")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-batch", type=int, help="Queries per search call (default: all at once)")
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpora = [normalize_rows(np.load(args.embeddings))]
+    else:
+        corpora = [synthetic_corpus(n, dim=args.dim) for n in args.sizes]
+
+    results = []
+    for corpus in corpora:
+        n_queries = min(args.queries, len(corpus))
+        results.extend(run(corpus, n_queries, args.top_k, args.n_probe, args.n_lists, args.query_batch))
+
+    print(f"{'n':>8}  {'backend':<36} {'recall@' + str(args.top_k):>10} {'ms/query':>9} {'MB':>8}")
+    for row in results:
+        print(f"{row['n']:>8}  {row['backend']:<36} {row['recall']:>10.3f} {row['ms_per_query']:>9.3f} "
+              f"{row['vector_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
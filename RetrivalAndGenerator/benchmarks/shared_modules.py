@@ -0,0 +1,51 @@
+"""Check that the modules both apps carry a copy of are still identical.
+
+Run from the RetrivalAndGenerator directory:
+
+    python -m benchmarks.shared_modules
+    python -m benchmarks.shared_modules --heading-extractor ../HeadingExtractor
+
+Each app is built from its own directory as a separate container, so neither
+can import the other's code; the shared modules are copied instead. Edit one
+copy, copy it over, and run this check. Exits with status 1 when a pair
+differs or a copy is missing.
+"""
+import argparse
+import difflib
+from pathlib import Path
+
+# RetrivalAndGenerator path -> HeadingExtractor path
+SHARED_MODULES = {
+    "scripts/inference_backend.py": "src/inference_backend.py",
+    "scripts/tracing.py": "src/tracing.py",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heading-extractor", default="../HeadingExtractor", help="HeadingExtractor checkout")
+    args = parser.parse_args()
+
+    heading_extractor_dir = Path(args.heading_extractor)
+    failed = False
+    for ours, theirs in SHARED_MODULES.items():
+        ours_path, theirs_path = Path(ours), heading_extractor_dir / theirs
+        if not ours_path.exists() or not theirs_path.exists():
+            print(f"❌ Missing: {ours_path if not ours_path.exists() else theirs_path}")
+            failed = True
+            continue
+        ours_text, theirs_text = ours_path.read_bytes(), theirs_path.read_bytes()
+        if ours_text == theirs_text:
+            print(f"✅ {ours} == {theirs_path}")
+            continue
+        failed = True
+        print(f"❌ {ours} differs from {theirs_path}:")
+        diff = difflib.unified_diff(ours_text.decode("utf-8").splitlines(), theirs_text.decode("utf-8").splitlines(),
+                                    str(ours_path), str(theirs_path), lineterm="")
+        print("\n".join(diff))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Tiny deterministic stand-ins for MiniLM and TinyLlama, so benchmarks run in CI
+without model files. They exercise every code path around the models, but
+their timings say nothing about the real models' cost.
+"""
+import re
+import threading
+import zlib
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEncoder:
+    """SentenceTransformer look-alike: hashed bag of words projected to `dim` floats"""
+
+    device = "cpu"
+
+    def __init__(self, model_path: str = "stand-in", dim: int = 384):
+        self.model_path = model_path
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, convert_to_tensor: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        matrix = np.stack([self._embed(s) for s in texts]) if texts else np.empty((0, self.dim), dtype=np.float32)
+        result = matrix[0] if single else matrix
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(np.ascontiguousarray(result))
+        return result
+
+
+class EchoLlama:
+    """llama_cpp.Llama look-alike that answers with the first words of the prompt's context"""
+
+    def __init__(self, model_path: str = "stand-in", n_ctx: int = 2048, completion_words: int = 48, **settings):
+        self.model_path = model_path
+        self._n_ctx = n_ctx
+        self.completion_words = completion_words
+        self._vocab: Dict[str, int] = {}
+        self._words: List[str] = []
+        self._vocab_lock = threading.Lock()
+        self._state: tuple = ()
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [0] if add_bos else []
+        with self._vocab_lock:
+            for word in text.decode("utf-8", errors="ignore").split():
+                if word not in self._vocab:
+                    self._vocab[word] = len(self._words) + 1
+                    self._words.append(word)
+                tokens.append(self._vocab[word])
+        return tokens
+
+    def detokenize(self, tokens: List[int]) -> bytes:
+        return " ".join(self._words[t - 1] for t in tokens if t > 0).encode("utf-8")
+
+    def reset(self):
+        self._state = ()
+
+    def eval(self, tokens: List[int]):
+        self._state = self._state + tuple(tokens)
+
+    def save_state(self) -> tuple:
+        return self._state
+
+    def load_state(self, state: tuple):
+        self._state = state
+
+    def __call__(self, prompt: str, max_tokens: int = 512, stream: bool = False, **params):
+        context = prompt.split("Context:\n", 1)[-1]
+        words = context.split()[:min(max_tokens, self.completion_words)]
+        if stream:
+            return self._stream(words)
+        return {"choices": [{"text": " ".join(words)}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(words)}}
+
+    @staticmethod
+    def _stream(words: List[str]) -> Iterator[Dict]:
+        for word in words:
+            yield {"choices": [{"text": " " + word}]}
@@ -0,0 +1,150 @@
+"""Synthetic PDF collections for benchmarks, generated offline with PyMuPDF.
+
+Every PDF has a title, chapter (H1) and section (H2) headings in distinct font
+sizes over body paragraphs, so both the RAG pipeline and HeadingExtractor's
+font-hierarchy outline have realistic input. Output is deterministic per seed.
+
+    python -m benchmarks.synthetic_pdfs ./bench_input/Collection 1 --pdfs 5 --pages 8
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+TOPICS = {
+    "forms": ["fillable", "forms", "fields", "checkbox", "signature", "e-signatures", "submit", "template"],
+    "travel": ["itinerary", "hotel", "beach", "museum", "restaurant", "nightlife", "train", "budget"],
+    "cooking": ["recipe", "vegetarian", "buffet", "gluten-free", "dinner", "ingredients", "menu", "oven"],
+    "research": ["dataset", "benchmark", "methodology", "baseline", "evaluation", "results", "model", "survey"],
+}
+FILLER = (
+    "the a of and to in is for with on as by this that from at be are it or an which can more also "
+    "their each most other some these such when into only over after new first use may well between"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT, MARGIN = 595, 842, 56
+
+
+class FontHierarchy(NamedTuple):
+    """Font sizes of each heading level; HeadingExtractor groups lines by these"""
+    title: float = 24.0
+    h1: float = 18.0
+    h2: float = 14.0
+    body: float = 10.5
+
+
+def _sentence(rng: np.random.Generator, topic_words: List[str], n_words: int) -> str:
+    words = [
+        topic_words[rng.integers(len(topic_words))] if rng.random() < 0.25 else FILLER[rng.integers(len(FILLER))]
+        for _ in range(n_words)
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: np.random.Generator, topic_words: List[str], n_words: int) -> str:
+    sentences, remaining = [], n_words
+    while remaining > 0:
+        length = min(remaining, int(rng.integers(8, 20)))
+        sentences.append(_sentence(rng, topic_words, length))
+        remaining -= length
+    return " ".join(sentences)
+
+
+def generate_pdf(path: Path, pages: int = 5, sections_per_page: int = 2, paragraphs_per_section: int = 2,
+                 words_per_paragraph: int = 80, topic: str = "forms", fonts: FontHierarchy = FontHierarchy(),
+                 seed: int = 0) -> Dict[str, int]:
+    """Write one PDF with exactly `pages` pages; returns counts of what was placed.
+
+    A chapter heading opens every other page, and each page carries
+    sections_per_page section headings with their paragraphs. Paragraphs that
+    do not fit on the page are dropped, so text volume is an upper bound.
+    """
+    rng = np.random.default_rng(seed)
+    topic_words = TOPICS[topic]
+    counts = {"pages": pages, "headings": 0, "paragraphs": 0, "words": 0}
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN
+
+        def place(text: str, size: float, bold: bool = False, gap: float = 6.0) -> bool:
+            nonlocal y
+            rect = fitz.Rect(MARGIN, y, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN)
+            # insert_textbox returns the unused height, or a negative value (and writes nothing) on overflow
+            left = page.insert_textbox(rect, text, fontsize=size, fontname="hebo" if bold else "helv")
+            if left < 0:
+                return False
+            y = PAGE_HEIGHT - MARGIN - left + gap
+            return True
+
+        if page_no == 0:
+            place(f"{topic.title()} Handbook {seed}", fonts.title, bold=True, gap=14)
+            counts["headings"] += 1
+        if page_no % 2 == 0:
+            place(f"Chapter {page_no // 2 + 1}: {' '.join(rng.choice(topic_words, 2)).title()}", fonts.h1, bold=True)
+            counts["headings"] += 1
+        for section in range(sections_per_page):
+            if not place(f"{page_no + 1}.{section + 1} {' '.join(rng.choice(topic_words, 3)).title()}",
+                         fonts.h2, bold=True):
+                break
+            counts["headings"] += 1
+            for _ in range(paragraphs_per_section):
+                text = _paragraph(rng, topic_words, words_per_paragraph)
+                if not place(text, fonts.body):
+                    break
+                counts["paragraphs"] += 1
+                counts["words"] += len(text.split())
+    doc.save(str(path))
+    doc.close()
+    return counts
+
+
+def generate_collection(collection_dir: Path, n_pdfs: int = 3, pages: int = 5, seed: int = 0,
+                        **pdf_params) -> Dict:
+    """Write PDFs/ plus a challenge1b_input.json like the bundled collections"""
+    pdf_dir = Path(collection_dir) / "PDFs"
+    pdf_dir.mkdir(parents=True, exist_ok=True)
+    topics = sorted(TOPICS)
+    documents, totals = [], {"pdfs": n_pdfs, "pages": 0, "headings": 0, "paragraphs": 0, "words": 0}
+    for i in range(n_pdfs):
+        topic = topics[i % len(topics)]
+        filename = f"synthetic_{i:03d}_{topic}.pdf"
+        counts = generate_pdf(pdf_dir / filename, pages=pages, topic=topic, seed=seed * 1000 + i, **pdf_params)
+        for key in ("pages", "headings", "paragraphs", "words"):
+            totals[key] += counts[key]
+        documents.append({"filename": filename, "title": Path(filename).stem})
+
+    input_json = {
+        "challenge_info": {"challenge_id": "synthetic", "test_case_name": f"synthetic_{n_pdfs}x{pages}",
+                           "description": "Synthetic benchmark collection"},
+        "documents": documents,
+        "persona": {"role": "HR professional"},
+        "job_to_be_done": {"task": "Create and manage fillable forms for onboarding and compliance."},
+    }
+    with open(Path(collection_dir) / "challenge1b_input.json", "w", encoding="utf-8") as f:
+        json.dump(input_json, f, indent=4)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("collection_dir")
+    parser.add_argument("--pdfs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--sections-per-page", type=int, default=2)
+    parser.add_argument("--paragraphs-per-section", type=int, default=2)
+    parser.add_argument("--words-per-paragraph", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    totals = generate_collection(Path(args.collection_dir), n_pdfs=args.pdfs, pages=args.pages, seed=args.seed,
+                                 sections_per_page=args.sections_per_page,
+                                 paragraphs_per_section=args.paragraphs_per_section,
+                                 words_per_paragraph=args.words_per_paragraph)
+    print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Padded tokens per batch: 32 full-length MiniLM chunks, sentence-transformers' default batch
+DEFAULT_TOKEN_BUDGET = 4096
+# Upper bound on texts per batch however short they are
+MAX_BATCH_SIZE = 256
+
+
+def plan_batches(lengths: np.ndarray, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_batch_size: int = MAX_BATCH_SIZE) -> List[np.ndarray]:
+    """Group text indices into batches of similar length whose padded size fits token_budget.
+
+    Texts are taken longest first, so each batch is padded to the length of
+    its first text and grows while batch size x that length fits the budget:
+    short texts travel in large batches, long ones in small batches. A text
+    longer than the budget gets a batch of its own.
+    """
+    lengths = np.asarray(lengths)
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(token_budget // longest, max_batch_size))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def padded_tokens(lengths: np.ndarray, batches: List[np.ndarray]) -> Tuple[int, int]:
+    """Real tokens and tokens after padding every batch to its longest text"""
+    lengths = np.asarray(lengths)
+    return int(lengths.sum()), sum(len(rows) * int(lengths[rows].max()) for rows in batches if len(rows))
+
+
+_worker_model = None
+
+
+def _init_worker(model_path: str, backend: str, threads: int, cores):
+    global _worker_model
+    core = cores.get()
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    from scripts.model_registry import get_sentence_transformer
+    _worker_model = get_sentence_transformer(model_path, backend=backend, threads=threads)
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    vectors = _worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False, convert_to_numpy=True)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class EncodePool:
+    """Worker processes that each load the model once and encode whole batches.
+
+    With one thread per worker, worker i is pinned to the i-th core this
+    process may run on, so workers do not migrate or compete for a core.
+    Workers are started with "spawn": forking a process that has already run
+    PyTorch's thread pool can deadlock.
+    """
+
+    def __init__(self, model_path: str, backend: str = "torch", workers: Optional[int] = None,
+                 threads_per_worker: int = 1):
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        self.workers = workers or len(cores) or os.cpu_count() or 1
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        for i in range(self.workers):
+            queue.put(cores[i % len(cores)] if cores and threads_per_worker == 1 else None)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker,
+                                             initargs=(model_path, backend, threads_per_worker, queue))
+
+    def encode(self, batches: List[List[str]]) -> List[np.ndarray]:
+        """Vectors for each batch, in the order given"""
+        return list(self._executor.map(_encode_batch, batches))
+
+    def close(self):
+        self._executor.shutdown()
@@ -1,23 +1,170 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict
+import json
+import re
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
 
-# Set your desired chunk configuration
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=768,
-    chunk_overlap=100,
-    separators=["\n\n", "\n", ".", "?", "!", ""]
-)
+import numpy as np
 
-def chunk_pdf_pages(pages: List[Dict]) -> List[Dict]:
-    """Chunk each page text into overlapping semantic units"""
-    chunks = []
+from scripts.model_paths import DEFAULT_MODEL_PATH
+
+# Places a chunk should end, after the whitespace that follows: a blank line (paragraph)
+# or sentence punctuation. Line breaks come next; PDF text also breaks lines wherever the
+# layout wrapped them, so they are only searched for when no sentence end fits.
+# Two patterns scan faster than one alternation
+_SENTENCE_END = re.compile(r"[.?!][\"')\]]*\s+")
+_PARAGRAPH = re.compile(r"\n\s*\n\s*")
+# Character classes for approximate_token_starts: 0 whitespace, 1 word character, 2 anything else
+_CHAR_CLASS = bytes(
+    0 if chr(i) in " \t\n\r\x0b\x0c" else 1 if chr(i).isalnum() or chr(i) == "_" else 2 for i in range(128)
+) + b"\x02" * 128
+# Room for [CLS] and [SEP] within the model's max_seq_length
+SPECIAL_TOKENS = 2
+DEFAULT_MAX_SEQ_LENGTH = 128
+OVERLAP_TOKENS = 16
+
+
+def approximate_token_starts(text: str) -> List[int]:
+    """One token per word and per punctuation mark or non-ASCII character.
+
+    Used when the model's tokenizer is unavailable. Vectorized, so it costs a
+    fraction of a regex scan; it undercounts only long rare words, which
+    WordPiece splits further, and overcounts accented text.
+    """
+    # "replace" turns every non-ASCII character into one "?", so indices stay character offsets
+    classes = np.frombuffer(text.encode("ascii", "replace").translate(_CHAR_CLASS), dtype=np.uint8)
+    word = classes == 1
+    token = classes == 2
+    token[1:] |= word[1:] & ~word[:-1]
+    if len(token):
+        token[0] |= word[0]
+    return np.flatnonzero(token).tolist()
+
+
+def load_token_starts(model_path: str = DEFAULT_MODEL_PATH) -> Callable[[str], List[int]]:
+    """Character offset of every token the embedding model's tokenizer produces for a text.
+
+    Uses the fast tokenizer saved with the model (tokenizer.json, via the
+    `tokenizers` package that sentence-transformers installs); falls back to an
+    approximate count when either is missing.
+    """
+    try:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(str(Path(model_path) / "tokenizer.json"))
+    except Exception:
+        return approximate_token_starts
+    # The saved tokenizer truncates to max_seq_length; count every token instead
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return lambda text: [start for start, _ in tokenizer.encode(text, add_special_tokens=False).offsets]
+
+
+def model_max_tokens(model_path: str = DEFAULT_MODEL_PATH) -> int:
+    """Tokens of text the model embeds before truncating (max_seq_length less special tokens)"""
+    try:
+        with open(Path(model_path) / "sentence_bert_config.json", "r", encoding="utf-8") as f:
+            max_seq_length = json.load(f)["max_seq_length"]
+    except (OSError, KeyError, ValueError):
+        max_seq_length = DEFAULT_MAX_SEQ_LENGTH
+    return max_seq_length - SPECIAL_TOKENS
+
+
+class TokenChunker:
+    """Splits text into overlapping chunks of at most max_tokens embedding tokens.
+
+    Chunks are returned as (start, end) character offsets into the text, so
+    nothing is copied until a caller slices it. Each chunk is filled up to the
+    limit and then cut at the coarsest break in its second half: paragraph,
+    sentence end, then line break. Failing those it ends at the last space, and
+    as a last resort between tokens. The next chunk starts at the earliest
+    paragraph or sentence boundary within the last overlap_tokens of the
+    previous one, if there is one.
+    """
+
+    def __init__(self, token_starts: Callable[[str], List[int]] = approximate_token_starts,
+                 max_tokens: int = DEFAULT_MAX_SEQ_LENGTH - SPECIAL_TOKENS, overlap_tokens: int = OVERLAP_TOKENS):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.token_starts = token_starts
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split(self, text: str) -> List[Tuple[int, int]]:
+        starts = self.token_starts(text)
+        n_tokens = len(starts)
+        paragraphs = [m.end() for m in _PARAGRAPH.finditer(text)]
+        boundaries = sorted([m.end() for m in _SENTENCE_END.finditer(text)] + paragraphs)
+        paragraphs = set(paragraphs)
+
+        chunks = []
+        start, first = 0, 0  # character and token offset of the current chunk
+        while n_tokens - first > self.max_tokens:
+            # A chunk ending at character p holds the tokens that start before p, so it
+            # fits while p <= cut, and is more than half full once p > half
+            cut = starts[first + self.max_tokens]
+            half = starts[first + self.max_tokens // 2]
+            end = self._boundary(boundaries, paragraphs, half, cut) or self._break_line(text, starts[first], half, cut)
+            span = _strip(text, start, end)
+            if span[0] < span[1]:
+                chunks.append(span)
+            # Overlap: resume at the earliest boundary inside the chunk's last overlap_tokens
+            tail = starts[max(bisect_left(starts, end) - self.overlap_tokens - 1, first)]
+            i = bisect_right(boundaries, tail)
+            start = boundaries[i] if i < len(boundaries) and boundaries[i] < end else end
+            first = bisect_left(starts, start)
+        span = _strip(text, start, len(text))
+        if span[0] < span[1]:
+            chunks.append(span)
+        return chunks
+
+    @staticmethod
+    def _boundary(boundaries: List[int], paragraphs: set, half: int, cut: int) -> Optional[int]:
+        """Last paragraph break in (half, cut], else the last sentence end there"""
+        lo, hi = bisect_right(boundaries, half), bisect_right(boundaries, cut)
+        for i in range(hi - 1, lo - 1, -1):
+            if boundaries[i] in paragraphs:
+                return boundaries[i]
+        return boundaries[hi - 1] if hi > lo else None
+
+    @staticmethod
+    def _break_line(text: str, first_char: int, half: int, cut: int) -> int:
+        """Last line break in (half, cut], else the last space after the first token, else cut"""
+        i = text.rfind("\n", half, cut)
+        if i < 0:
+            i = text.rfind(" ", first_char, cut)
+        return i + 1 if i >= 0 else cut
+
+
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+_chunker: Optional[TokenChunker] = None
+
+def get_chunker() -> TokenChunker:
+    """Chunker sized to the embedding model, built once per process on first use"""
+    global _chunker
+    if _chunker is None:
+        _chunker = TokenChunker(load_token_starts(), max_tokens=model_max_tokens())
+    return _chunker
+
+def iter_page_chunks(pages: Iterable[Dict]) -> Iterator[Dict]:
+    """Lazily chunk each page text into overlapping units that fit the embedding model"""
+    chunker = get_chunker()
     for page in pages:
-        splits = text_splitter.split_text(page["text"])
-        for i, chunk in enumerate(splits):
-            chunks.append({
+        text = page["text"]
+        for i, (start, end) in enumerate(chunker.split(text)):
+            yield {
                 "pdf_name": page["pdf_name"],
                 "page_number": page["page_number"],
                 "chunk_index": i,
-                "chunk_text": chunk
-            })
-    return chunks
+                "chunk_text": text[start:end],
+            }
+
+def chunk_pdf_pages(pages: List[Dict]) -> List[Dict]:
+    """Chunk each page text into overlapping units that fit the embedding model"""
+    return list(iter_page_chunks(pages))
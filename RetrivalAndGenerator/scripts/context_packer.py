@@ -0,0 +1,83 @@
+import re
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from scripts.searcher import normalize_rows
+
+# Sentence ends followed by whitespace; newlines also split since PDF text keeps line breaks
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# A leftover budget smaller than this is not worth a compressed chunk
+MIN_CHUNK_TOKENS = 24
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+class ContextPacker:
+    """Fit chunk texts into a token budget, compressing the chunk that overflows.
+
+    Chunks are taken in the order given (best first) and kept whole while they
+    fit. The first chunk that does not fit is cut down to the sentences most
+    similar to the query (or its leading sentences when no query vector is
+    given), kept in their original order, and packing stops there.
+    """
+
+    def __init__(self, tokenize: Callable[[str], List[int]], detokenize: Callable[[List[int]], str],
+                 encode: Optional[Callable[[List[str]], np.ndarray]] = None):
+        self.tokenize = tokenize
+        self.detokenize = detokenize
+        # texts -> embedding matrix; the MiniLM embedder's cache makes repeats free
+        self.encode = encode
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenize(text))
+
+    def pack(self, chunks: List[Dict], budget: int, query_vector: Optional[np.ndarray] = None,
+             separator: str = "\n") -> List[str]:
+        """Return the chunk texts (whole or compressed) that fit in budget tokens"""
+        separator_tokens = self.count_tokens(separator) if separator else 0
+        packed: List[str] = []
+        remaining = budget
+        for chunk in chunks:
+            if packed:
+                remaining -= separator_tokens
+            text = chunk["chunk_text"]
+            tokens = self.count_tokens(text)
+            if tokens <= remaining:
+                packed.append(text)
+                remaining -= tokens
+                continue
+            if remaining >= MIN_CHUNK_TOKENS:
+                compressed = self.compress(text, remaining, query_vector)
+                if compressed:
+                    packed.append(compressed)
+            break
+        return packed
+
+    def compress(self, text: str, budget: int, query_vector: Optional[np.ndarray] = None) -> str:
+        """Keep the sentences of text most similar to the query that fit in budget tokens"""
+        sentences = split_sentences(text)
+        if not sentences:
+            return ""
+        lengths = [self.count_tokens(s) + 1 for s in sentences]  # +1 for the joining space
+
+        if query_vector is not None and self.encode is not None and len(sentences) > 1:
+            vectors = normalize_rows(self.encode(sentences))
+            query = np.asarray(query_vector, dtype=np.float32).ravel()
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            order = np.argsort(-(vectors @ query), kind="stable").tolist()
+        else:
+            order = list(range(len(sentences)))
+
+        chosen, used = [], 0
+        for i in order:
+            if used + lengths[i] <= budget:
+                chosen.append(i)
+                used += lengths[i]
+        if not chosen:
+            # Even the best sentence is too long: keep as many of its tokens as fit
+            return self.detokenize(self.tokenize(sentences[order[0]])[:budget]).strip()
+        return " ".join(sentences[i] for i in sorted(chosen))
@@ -0,0 +1,372 @@
+import hashlib
+import itertools
+import json
+import mmap
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from scripts import tracing
+
+# Bumped whenever stored chunks would differ for the same PDF (2: token-sized chunks)
+STORE_VERSION = 2
+
+# One fixed-size record per chunk; the text lives in a separate UTF-8 blob
+CHUNK_DTYPE = np.dtype([
+    ("pdf_id", "<i4"),
+    ("page_number", "<i4"),
+    ("chunk_index", "<i4"),
+    ("text_start", "<i8"),
+    ("text_end", "<i8"),
+])
+
+# Rows copied at a time from the previous generation while rewriting the store
+_COPY_BLOCK = 65536
+
+# Bytes reserved for the .npy header so rows can be appended before the final shape is known
+_NPY_HEADER_SIZE = 256
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _NpyAppender:
+    """Write a .npy file row batch by row batch; the header is filled in on close"""
+
+    def __init__(self, path: Path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape: Optional[Tuple[int, ...]] = None
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._file.write(b"\0" * _NPY_HEADER_SIZE)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def append(self, rows: np.ndarray):
+        if self.row_shape is None:
+            self.row_shape = rows.shape[1:]
+        self._file.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+        self.rows += len(rows)
+
+    def truncate(self, rows: int):
+        row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape or ()))
+        self._file.seek(_NPY_HEADER_SIZE + rows * row_bytes)
+        self._file.truncate()
+        self.rows = rows
+
+    def close(self, row_shape: Optional[Tuple[int, ...]] = None):
+        shape = (self.rows,) + tuple(self.row_shape or row_shape or ())
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": shape}
+        # Pad the header dict with spaces so magic + length + dict fill the reserved bytes exactly
+        body = repr(header).encode("latin1")
+        if len(body) + 11 > _NPY_HEADER_SIZE:
+            raise ValueError(f"Header for {self.path} does not fit in {_NPY_HEADER_SIZE} bytes")
+        body += b" " * (_NPY_HEADER_SIZE - 10 - len(body) - 1) + b"\n"
+        self._file.seek(0)
+        self._file.write(b"\x93NUMPY\x01\x00" + len(body).to_bytes(2, "little") + body)
+        self._file.close()
+
+
+class StoredChunks(Sequence):
+    """Read-only chunk dicts decoded on demand from the metadata and text blob"""
+
+    def __init__(self, records: np.ndarray, text: bytes, pdf_names: List[str]):
+        self.records = records
+        self.text = text
+        self.pdf_names = pdf_names
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        rec = self.records[idx]
+        return {
+            "pdf_name": self.pdf_names[rec["pdf_id"]],
+            "page_number": int(rec["page_number"]),
+            "chunk_index": int(rec["chunk_index"]),
+            "chunk_text": self.text[rec["text_start"]:rec["text_end"]].decode("utf-8"),
+        }
+
+
+class CorpusStore:
+    """Per-collection on-disk index of chunk embeddings, metadata and PDF hashes.
+
+    Every sync writes a new generation of files (embeddings.<gen>.npy as
+    unit-length float16, chunks.<gen>.npy records, chunks.<gen>.txt text) and
+    then atomically replaces manifest.json, so readers never see a half-written
+    index. Rows are grouped per PDF, and the manifest records each PDF's row
+    range alongside its content hash. Data derived from a generation (e.g. a
+    search index) is saved next to it with sidecar() and dropped with it.
+    """
+
+    def __init__(self, root: Path, model_id: str = ""):
+        self.root = Path(root)
+        self.model_id = model_id
+        self.manifest: Dict = {}
+        self.embeddings: np.ndarray = np.empty((0, 0), dtype=np.float16)
+        self.chunks: Sequence = []
+        # Generation left behind by a different model or format, removed on the next write
+        self._stale_generation: Optional[int] = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def _paths(self, generation: int) -> Dict[str, Path]:
+        return {
+            "embeddings": self.root / f"embeddings.{generation}.npy",
+            "records": self.root / f"chunks.{generation}.npy",
+            "text": self.root / f"chunks.{generation}.txt",
+        }
+
+    def open(self) -> bool:
+        """Map the current generation without reading it into memory; False if there is none"""
+        self.manifest, self.chunks = {}, []
+        self.embeddings = np.empty((0, 0), dtype=np.float16)
+        if not self.manifest_path.exists():
+            return False
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != STORE_VERSION or manifest.get("model_id") != self.model_id:
+            self._stale_generation = manifest.get("generation")
+            return False
+
+        paths = self._paths(manifest["generation"])
+        self.manifest = manifest
+        self.embeddings = np.load(paths["embeddings"], mmap_mode="r")
+        records = np.load(paths["records"], mmap_mode="r")
+        if paths["text"].stat().st_size:
+            with open(paths["text"], "rb") as f:
+                text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            text = b""
+        self.chunks = StoredChunks(records, text, [pdf["name"] for pdf in manifest["pdfs"]])
+        return True
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _sidecar_path(self, generation: int, name: str, key: str) -> Path:
+        return self.root / f"{name}.{generation}.{key}.npy"
+
+    def sidecar(self, name: str, params: Dict, build: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Arrays derived from the current generation, memory-mapped; built and saved on first use.
+
+        They are rebuilt when params (JSON-serializable) differ from those they
+        were saved with, and removed along with the generation.
+        """
+        generation = self.manifest.get("generation")
+        if generation is None:  # nothing synced yet, so nothing to attach it to
+            return build()
+        saved = self.manifest.get("sidecars", {}).get(name)
+        if saved is None or saved["params"] != params:
+            arrays = build()
+            for key, array in arrays.items():
+                path = self._sidecar_path(generation, name, key)
+                tmp_path = path.with_suffix(".npy.tmp")
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp_path, path)
+            saved = {"params": params, "arrays": sorted(arrays)}
+            self.manifest.setdefault("sidecars", {})[name] = saved
+            self._write_manifest(generation, [{k: v for k, v in pdf.items() if k != "rows"}
+                                              for pdf in self.manifest["pdfs"]],
+                                 [pdf["rows"] for pdf in self.manifest["pdfs"]])
+        return {key: np.load(self._sidecar_path(generation, name, key), mmap_mode="r") for key in saved["arrays"]}
+
+    def sync(
+        self,
+        pdf_paths: List[Path],
+        chunk_pdfs: Callable[[List[Path]], Iterable[Optional[Iterable[Dict]]]],
+        encode: Callable[[List[str]], np.ndarray],
+        batch_size: int = 64,
+    ) -> Dict[str, int]:
+        """Bring the store in line with pdf_paths, re-processing only added or changed PDFs.
+
+        chunk_pdfs yields, in order, each given PDF's chunk dicts (None for a PDF
+        that failed); encode turns a batch of chunk texts into vectors. Chunks are
+        embedded batch_size at a time and written straight to disk, so memory use
+        does not grow with the collection. Chunks of PDFs that are no longer listed
+        are dropped; a changed PDF that fails to parse keeps its old chunks and is
+        retried on the next sync. An error from encode is not a PDF's fault: it
+        propagates, and the store keeps its current generation.
+        """
+        self.open()
+        old_pdfs = {pdf["name"]: pdf for pdf in self.manifest.get("pdfs", [])}
+        names = [p.name for p in pdf_paths]
+        entries, status = self._diff(pdf_paths, old_pdfs)
+        stats = {"unchanged": 0, "added": 0, "changed": 0, "failed": 0,
+                 "removed": len(set(old_pdfs) - set(names))}
+        for state in status.values():
+            stats[state] += 1
+        fresh = {path.name: path for path in pdf_paths if status[path.name] != "unchanged"}
+
+        if not fresh and not stats["removed"] and names == list(old_pdfs):
+            if any(e["mtime_ns"] != old_pdfs[e["name"]]["mtime_ns"] for e in entries):
+                self._write_manifest(self.manifest["generation"], entries, [old_pdfs[n]["rows"] for n in names])
+            return stats
+
+        self._write_generation(entries, old_pdfs, fresh, chunk_pdfs, encode, batch_size, stats)
+        self.open()
+        return stats
+
+    @staticmethod
+    def _diff(pdf_paths: List[Path], old_pdfs: Dict[str, Dict]) -> Tuple[List[Dict], Dict[str, str]]:
+        """Manifest entries for pdf_paths, and each PDF's status: added, changed or unchanged"""
+        entries, status = [], {}
+        for path in pdf_paths:
+            st = path.stat()
+            entry = {"name": path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            old = old_pdfs.get(path.name)
+            # Size and mtime match: trust the stored hash instead of re-reading the file
+            if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                entry["sha256"] = old["sha256"]
+            else:
+                entry["sha256"] = file_sha256(path)
+            if old and old["sha256"] == entry["sha256"]:
+                status[path.name] = "unchanged"
+            else:
+                status[path.name] = "changed" if old else "added"
+            entries.append(entry)
+        return entries, status
+
+    def plan(self, pdf_paths: List[Path]) -> Dict[str, List[str]]:
+        """What sync(pdf_paths) would do, by PDF name, without parsing or writing anything"""
+        self.open()
+        old_pdfs = {pdf["name"]: pdf for pdf in self.manifest.get("pdfs", [])}
+        _, status = self._diff(pdf_paths, old_pdfs)
+        names = {path.name for path in pdf_paths}
+        plan = {"unchanged": [], "added": [], "changed": [],
+                "removed": [name for name in old_pdfs if name not in names]}
+        for name, state in status.items():
+            plan[state].append(name)
+        return plan
+
+    def _write_generation(self, entries: List[Dict], old_pdfs: Dict[str, Dict], fresh: Dict[str, Path],
+                          chunk_pdfs: Callable, encode: Callable, batch_size: int, stats: Dict[str, int]):
+        """Stream unchanged rows and freshly embedded batches into a new generation"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        old_generation = self.manifest.get("generation", self._stale_generation)
+        generation = (old_generation or 0) + 1
+        paths = self._paths(generation)
+
+        fresh_stream = iter(chunk_pdfs(list(fresh.values())))
+        written_entries, row_ranges = [], []
+        embeddings = _NpyAppender(paths["embeddings"], np.float16)
+        records = _NpyAppender(paths["records"], CHUNK_DTYPE)
+        with open(paths["text"], "wb") as text_out:
+            for entry in entries:
+                name = entry["name"]
+                row_start, text_start = len(records), text_out.tell()
+                if name in fresh:
+                    chunks = next(fresh_stream)
+                    failed = chunks is None  # parse_and_chunk_pdfs has logged why
+                    if not failed:
+                        error = self._append_fresh(
+                            len(written_entries), chunks, encode, batch_size, embeddings, records, text_out)
+                        if error is not None:
+                            tracing.log(f"⚠️ Skipping {name}: {error}", error=error)
+                            failed = True
+                    if failed:
+                        stats["failed"] += 1
+                        embeddings.truncate(row_start)
+                        records.truncate(row_start)
+                        text_out.seek(text_start)
+                        text_out.truncate()
+                        if name not in old_pdfs:
+                            continue
+                        # Keep the previous chunks and hash so the PDF is retried next sync
+                        entry = old_pdfs[name]
+                        self._copy_old(len(written_entries), entry, embeddings, records, text_out)
+                else:
+                    self._copy_old(len(written_entries), old_pdfs[name], embeddings, records, text_out)
+                written_entries.append(entry)
+                row_ranges.append([row_start, len(records)])
+
+        dim = embeddings.row_shape[0] if embeddings.row_shape else self.embeddings.shape[1]
+        embeddings.close(row_shape=(dim,))
+        records.close()
+        self._write_manifest(generation, written_entries, row_ranges, dim)
+
+        # Release the old maps before removing their files
+        self.embeddings, self.chunks = np.empty((0, 0), dtype=np.float16), []
+        self._stale_generation = None
+        if old_generation is not None:
+            for path in [*self._paths(old_generation).values(), *self.root.glob(f"*.{old_generation}.*.npy")]:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _append_fresh(pdf_id: int, chunks: Iterable[Dict], encode: Callable, batch_size: int,
+                      embeddings: "_NpyAppender", records: "_NpyAppender", text_out) -> Optional[str]:
+        """Embed a PDF's chunk stream batch by batch, appending rows as each batch is done.
+
+        Chunks may be parsed lazily, so a broken PDF fails while they are read:
+        that error is returned. Errors from encode are raised.
+        """
+        chunks = iter(chunks)
+        while True:
+            try:
+                batch = list(itertools.islice(chunks, batch_size))
+            except Exception as e:
+                return f"{type(e).__name__}: {e}"
+            if not batch:
+                return None
+            vectors = np.asarray(encode([c["chunk_text"] for c in batch]), dtype=np.float32)
+            norms = np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            embeddings.append((vectors / norms).astype(np.float16))
+
+            batch_records = np.zeros(len(batch), dtype=CHUNK_DTYPE)
+            for i, chunk in enumerate(batch):
+                encoded = chunk["chunk_text"].encode("utf-8")
+                start = text_out.tell()
+                text_out.write(encoded)
+                batch_records[i] = (pdf_id, chunk["page_number"], chunk["chunk_index"], start, start + len(encoded))
+            records.append(batch_records)
+
+    def _copy_old(self, pdf_id: int, old_entry: Dict, embeddings: "_NpyAppender",
+                  records: "_NpyAppender", text_out):
+        """Copy an unchanged PDF's rows and text span straight from the old generation"""
+        old_start, old_end = old_entry["rows"]
+        for start in range(old_start, old_end, _COPY_BLOCK):
+            stop = min(start + _COPY_BLOCK, old_end)
+            embeddings.append(np.asarray(self.embeddings[start:stop]))
+            old_records = np.array(self.chunks.records[start:stop])
+            span_start, span_end = old_records["text_start"][0], old_records["text_end"][-1]
+            shift = text_out.tell() - span_start
+            text_out.write(self.chunks.text[span_start:span_end])
+            old_records["pdf_id"] = pdf_id
+            old_records["text_start"] += shift
+            old_records["text_end"] += shift
+            records.append(old_records)
+
+    def _write_manifest(self, generation: int, entries: List[Dict], row_ranges: List, dim: Optional[int] = None):
+        manifest = {
+            "version": STORE_VERSION,
+            "model_id": self.model_id,
+            "generation": generation,
+            "dim": dim if dim is not None else self.manifest.get("dim", 0),
+            "pdfs": [{**entry, "rows": rows} for entry, rows in zip(entries, row_ranges)],
+        }
+        # Sidecars belong to their generation; a new one starts without any
+        if self.manifest.get("generation") == generation and self.manifest.get("sidecars"):
+            manifest["sidecars"] = self.manifest["sidecars"]
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest = manifest
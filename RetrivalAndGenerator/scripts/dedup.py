@@ -0,0 +1,177 @@
+import hashlib
+import re
+import zlib
+from collections.abc import Sequence
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# MinHash permutations are multiply-shift hashes, h(x) = (a * x + b) >> 32 in wrapping
+# 64-bit arithmetic; no modulo, so a whole signature is two vectorized passes
+_SHIFT = np.uint64(32)
+NUM_PERM = 64
+# LSH bands of NUM_PERM // BANDS rows: pairs at 0.8 similarity share a band 99.9% of the time
+BANDS = 16
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.8
+
+
+class _WordHashes(dict):
+    """crc32 of each word, computed once; stable across processes, unlike hash()"""
+
+    def __missing__(self, word: str) -> int:
+        value = self[word] = zlib.crc32(word.encode("utf-8"))
+        return value
+
+
+class NearDuplicateIndex:
+    """Maps each added text to the earliest added text it duplicates.
+
+    Exact duplicates (the same words, ignoring case, spacing and punctuation)
+    are found by hash. Near duplicates are found by MinHash over word
+    3-shingles: texts sharing an LSH band are candidates, and a candidate
+    counts when the estimated Jaccard similarity reaches threshold. Only
+    canonical texts are indexed, so a chain of small edits never merges texts
+    that are far apart.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 seed: int = 0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.size = 0
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._word_hashes = _WordHashes()
+
+    def signature(self, words: List[str]) -> Optional[np.ndarray]:
+        """MinHash of the text's word shingles; None when it has fewer words than a shingle"""
+        if len(words) < SHINGLE_WORDS:
+            return None
+        hashes = np.fromiter(map(self._word_hashes.__getitem__, words), dtype=np.uint64, count=len(words))
+        shingles = hashes[:1 - SHINGLE_WORDS].copy()
+        for i in range(1, SHINGLE_WORDS):
+            shingles = (shingles * np.uint64(1000003)) ^ hashes[i:len(hashes) - SHINGLE_WORDS + 1 + i]
+        shingles &= np.uint64(0xFFFFFFFF)
+        return ((self.a[:, None] * shingles + self.b[:, None]) >> _SHIFT).min(axis=1).astype(np.uint32)
+
+    def add(self, text: str) -> int:
+        """Id of the earliest text this one duplicates, or its own new id if it is the first of its kind"""
+        text_id = self.size
+        self.size += 1
+        words = _WORD.findall(text.lower())
+        key = hashlib.blake2b((" ".join(words) if words else text.strip()).encode("utf-8"), digest_size=16).digest()
+        canonical = self._exact.get(key)
+        if canonical is not None:
+            return canonical
+
+        signature = self.signature(words)
+        if signature is not None:
+            r = self.rows_per_band
+            bands = [signature[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+            candidates = {c for band, bucket in zip(bands, self._buckets) for c in bucket.get(band, ())}
+            for candidate in sorted(candidates):
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    self._exact[key] = candidate
+                    return candidate
+            for band, bucket in zip(bands, self._buckets):
+                bucket.setdefault(band, []).append(text_id)
+            self._signatures[text_id] = signature
+        self._exact[key] = text_id
+        return text_id
+
+
+class DedupEncoder:
+    """Wraps an encode function so a text repeated verbatim reuses its first copy's vector.
+
+    Only texts not seen before are passed to encode, so every vector is the
+    one encode would give the text itself, whatever the dedup settings or
+    indexing order. Near duplicates are collapsed at search time instead:
+    the searcher gets a DedupedChunks of the store's chunks and a SelectedRows
+    view of their vectors. Create one per indexing run: each distinct text
+    keeps a 16-byte hash and its float16 vector for the wrapper's lifetime.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray]):
+        self.encode = encode
+        self.vectors: Dict[bytes, np.ndarray] = {}
+        self.reused = 0
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        keys = [hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() for text in texts]
+        new, first_of = [], {}
+        for i, key in enumerate(keys):
+            if key not in self.vectors and key not in first_of:
+                first_of[key] = i
+                new.append(i)
+        if new:
+            fresh = np.asarray(self.encode([texts[i] for i in new]), dtype=np.float32)
+            for i, vector in zip(new, fresh):
+                self.vectors[keys[i]] = vector.astype(np.float16)
+            if len(new) == len(texts):
+                return fresh
+        self.reused += len(texts) - len(new)
+        embeddings = np.stack([self.vectors[key] for key in keys]).astype(np.float32)
+        if new:
+            embeddings[new] = fresh
+        return embeddings
+
+
+def duplicate_groups(chunks: Sequence, threshold: float = DEFAULT_THRESHOLD) -> np.ndarray:
+    """Row of the first chunk each chunk duplicates (its own row if none), in chunk order"""
+    index = NearDuplicateIndex(threshold)
+    return np.fromiter((index.add(chunk["chunk_text"]) for chunk in chunks), dtype=np.int64, count=len(chunks))
+
+
+class DedupedChunks(Sequence):
+    """The canonical chunks of a chunk sequence, each listing every (pdf, page) its text appears on.
+
+    groups is duplicate_groups(chunks); rows are the canonical chunks' rows.
+    Chunks are decoded only when accessed.
+    """
+
+    def __init__(self, chunks: Sequence, groups: np.ndarray):
+        self.chunks = chunks
+        self.rows = np.flatnonzero(groups == np.arange(len(groups)))
+        self.copies: Dict[int, List[int]] = {}
+        for row in np.flatnonzero(groups != np.arange(len(groups))).tolist():
+            self.copies.setdefault(int(groups[row]), []).append(row)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        row = int(self.rows[idx])
+        chunk = self.chunks[row]
+        occurrences = [{"pdf_name": chunk["pdf_name"], "page_number": chunk["page_number"]}]
+        for copy in self.copies.get(row, ()):
+            place = {"pdf_name": self.chunks[copy]["pdf_name"], "page_number": self.chunks[copy]["page_number"]}
+            if place not in occurrences:
+                occurrences.append(place)
+        return {**chunk, "occurrences": occurrences}
+
+
+class SelectedRows:
+    """Some rows of a matrix (e.g. a memory-mapped store), read when indexed instead of copied up front"""
+
+    def __init__(self, matrix: np.ndarray, rows: np.ndarray):
+        self.matrix = matrix
+        self.rows = rows
+        self.shape = (len(rows),) + matrix.shape[1:]
+        self.dtype = matrix.dtype
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, idx) -> np.ndarray:
+        return self.matrix[self.rows[idx]]
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class DiskCache:
+    """SQLite-backed key/value store with LRU eviction, safe across processes"""
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # WAL lets readers in other processes proceed while one process writes;
+        # the busy timeout makes concurrent writers wait instead of failing.
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)"
+            )
+            # Running total of entry sizes, kept in step with every write so eviction
+            # need not scan the table; rebuilt here once, for caches written before it
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " total_bytes INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (id, total_bytes)"
+                " VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM entries))"
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Return the cached values for the keys that are present"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})", batch
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    with self._conn:
+                        self._conn.executemany(
+                            "UPDATE entries SET last_access = ? WHERE key = ?",
+                            [(now, k) for k, _ in rows],
+                        )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]):
+        """Insert or replace values, then evict least recently used entries over the cap"""
+        if not items:
+            return
+        now = time.time()
+        keys = list(items)
+        with self._lock:
+            with self._conn:
+                # One write transaction from the size lookup to eviction, so the total
+                # stays exact while other processes write too
+                self._conn.execute("BEGIN IMMEDIATE")
+                replaced = 0
+                for start in range(0, len(keys), _SQL_BATCH):
+                    batch = keys[start:start + _SQL_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    replaced += self._conn.execute(
+                        f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE key IN ({marks})", batch
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    [(k, sqlite3.Binary(v), len(v), now) for k, v in items.items()],
+                )
+                self._add_bytes(sum(len(v) for v in items.values()) - replaced)
+                self._evict()
+
+    def _add_bytes(self, delta: int):
+        self._conn.execute("UPDATE meta SET total_bytes = total_bytes + ? WHERE id = 0", (delta,))
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT total_bytes FROM meta WHERE id = 0").fetchone()[0]
+
+    def _evict(self):
+        """Delete least recently used entries until the total fits; runs inside set_many's transaction"""
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        freed = 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._add_bytes(-freed)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total = self._total_bytes()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
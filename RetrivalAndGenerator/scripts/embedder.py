@@ -1,18 +1,115 @@
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from typing import List, Dict, Optional
 import numpy as np
 
+from scripts.batching import DEFAULT_TOKEN_BUDGET, EncodePool, padded_tokens, plan_batches
+from scripts.chunk_text import SPECIAL_TOKENS, load_token_starts, model_max_tokens
+from scripts.embedding_cache import EmbeddingCache
+from scripts.model_paths import DEFAULT_MODEL_PATH
+from scripts.model_registry import LockedModel, get_encode_lock, get_sentence_transformer
+
 class MiniLMEmbedder:
-    def __init__(self, model_path: str = "./models/all-MiniLM-L12-v2"):
-        self.model = SentenceTransformer(model_path)
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, cache_dir: Optional[str] = "./cache",
+                 backend: str = "torch", token_budget: int = DEFAULT_TOKEN_BUDGET, workers: int = 1):
+        self.model_path = model_path
+        # "torch", or an exported "onnx" (int8) / "torchscript" copy of the model
+        self.backend = backend
+        self.model = get_sentence_transformer(model_path, backend=backend)
+        self._encode_lock = get_encode_lock(self.model)
+        # Pass cache_dir=None to always re-encode
+        self.cache = EmbeddingCache(cache_dir, model_path, backend=backend) if cache_dir else None
+        # Texts are batched by padded tokens, counted as the model's tokenizer would and capped at its limit
+        self.token_budget = token_budget
+        self._token_starts = load_token_starts(model_path)
+        self._special_tokens = SPECIAL_TOKENS
+        self._max_length = model_max_tokens(model_path) + SPECIAL_TOKENS
+        # workers > 1 encodes batches in that many processes, started on first use
+        self.workers = workers
+        self._pool: Optional[EncodePool] = None
+        self._stats = {"chunks": 0, "tokens": 0, "padded_tokens": 0, "batches": 0, "seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Tokens each text takes in a model batch, special tokens included"""
+        lengths = [len(self._token_starts(t)) + self._special_tokens for t in texts]
+        return np.minimum(np.array(lengths, dtype=np.int64), self._max_length)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode in length-bucketed batches of at most token_budget padded tokens, returned in text order"""
+        start = time.perf_counter()
+        lengths = self.token_lengths(texts)
+        batches = plan_batches(lengths, self.token_budget)
+        embeddings = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.workers > 1 and len(batches) > 1:
+            if self._pool is None:
+                self._pool = EncodePool(self.model_path, self.backend, workers=self.workers)
+            for rows, vectors in zip(batches, self._pool.encode([[texts[i] for i in rows] for rows in batches])):
+                embeddings[rows] = vectors
+        else:
+            with self._encode_lock:
+                for rows in batches:
+                    embeddings[rows] = self.model.encode([texts[i] for i in rows], batch_size=len(rows),
+                                                         show_progress_bar=False, convert_to_numpy=True)
+        tokens, padded = padded_tokens(lengths, batches)
+        with self._stats_lock:
+            self._stats["chunks"] += len(texts)
+            self._stats["tokens"] += tokens
+            self._stats["padded_tokens"] += padded
+            self._stats["batches"] += len(batches)
+            self._stats["seconds"] += time.perf_counter() - start
+        return embeddings
+
+    def stats(self) -> Dict[str, float]:
+        """Texts encoded so far, their tokens with and without padding, and encode time"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["chunks_per_s"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["padding_overhead"] = stats["padded_tokens"] / stats["tokens"] - 1 if stats["tokens"] else 0.0
+        return stats
+
+    def shared_model(self) -> LockedModel:
+        """The model for other components to encode with, serialized with this embedder's encodes"""
+        return LockedModel(self.model)
+
+    def close(self):
+        """Stop the encoding workers, if any were started"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def encode_texts(self, texts: List[str], show_progress_bar: bool = True) -> np.ndarray:
+        """Encode texts, reading cached vectors and encoding only the misses.
+
+        show_progress_bar is accepted for compatibility; texts are encoded in
+        many small batches, where a progress bar per call says little.
+        """
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts)
+
+        cached = self.cache.lookup(texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        dim = self.model.get_sentence_embedding_dimension()
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        for i, vector in cached.items():
+            embeddings[i] = vector
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = self._encode(missing_texts)
+            embeddings[missing] = fresh
+            self.cache.insert(missing_texts, fresh)
+        return embeddings
 
     def embed_chunks(self, chunks: List[Dict]) -> List[Dict]:
         """Embed each chunk's text and return with vector"""
         texts = [c["chunk_text"] for c in chunks]
-        embeddings = self.model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+        embeddings = self.encode_texts(texts)
         results = []
         for chunk, vector in zip(chunks, embeddings):
             chunk_with_embedding = dict(chunk)  # clone
-            chunk_with_embedding["embedding"] = vector.tolist()  # for JSON serializability
+            chunk_with_embedding["embedding"] = vector  # float32 row of the batch matrix
             results.append(chunk_with_embedding)
         return results
@@ -0,0 +1,50 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from scripts.disk_cache import DiskCache
+
+
+def model_fingerprint(model_path: str, backend: str = "torch") -> str:
+    """Identify a model by its path plus the names and sizes of its files, and the backend running it"""
+    digest = hashlib.sha256(str(model_path).encode("utf-8"))
+    # Exported backends give slightly different vectors; PyTorch keeps its original ids
+    if backend != "torch":
+        digest.update(f"\0{backend}".encode("utf-8"))
+    root = Path(model_path)
+    if root.is_file():
+        digest.update(str(root.stat().st_size).encode("utf-8"))
+    elif root.is_dir():
+        for f in sorted(p for p in root.rglob("*") if p.is_file()):
+            digest.update(f"{f.relative_to(root)}:{f.stat().st_size}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of chunk vectors for one model"""
+
+    def __init__(self, cache_dir: str, model_path: str, max_bytes: int = 512 * 1024 * 1024, backend: str = "torch"):
+        self.model_id = model_fingerprint(model_path, backend)
+        self.store = DiskCache(Path(cache_dir) / "embeddings.sqlite", max_bytes=max_bytes)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def lookup(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Return {position: vector} for every text already in the cache"""
+        keys = [self._key(t) for t in texts]
+        found = self.store.get_many(keys)
+        return {
+            i: np.frombuffer(found[k], dtype=np.float32)
+            for i, k in enumerate(keys)
+            if k in found
+        }
+
+    def insert(self, texts: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.store.set_many({self._key(t): v.tobytes() for t, v in zip(texts, vectors)})
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.stats()
@@ -0,0 +1,81 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words too common to narrow the candidate set
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its of on or that the this to was
+were what when where which who will with you your can do does not no so if into than then
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index over chunk texts, scored with Okapi BM25.
+
+    Postings are stored as flat numpy arrays (one doc-id and one term-frequency
+    array, sliced per term), so a query only touches the postings of its own
+    terms.
+    """
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        vocab: Dict[str, int] = {}
+        doc_ids: List[int] = []
+        term_ids: List[int] = []
+        freqs: List[int] = []
+        lengths: List[int] = []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                doc_ids.append(doc)
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                freqs.append(count)
+
+        self.vocab = vocab
+        self.n_docs = len(lengths)
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(self.doc_lengths.mean()) if self.n_docs else 0.0
+        self.length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(avg_length, 1e-9))
+
+        # Group postings by term so each term's postings are one contiguous slice
+        term_ids_arr = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids_arr, kind="stable")
+        self.postings = np.asarray(doc_ids, dtype=np.int64)[order]
+        self.freqs = np.asarray(freqs, dtype=np.float32)[order]
+        df = np.bincount(term_ids_arr, minlength=len(vocab))
+        self.offsets = np.concatenate([[0], np.cumsum(df)])
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def score(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, BM25 scores) of every document sharing a term with the query"""
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in terms]
+        docs = np.concatenate([self.postings[s] for s in slices])
+        tf = np.concatenate([self.freqs[s] for s in slices])
+        idf = np.concatenate([np.full(s.stop - s.start, self.idf[t]) for t, s in zip(terms, slices)])
+        contributions = idf * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        ids, inverse = np.unique(docs, return_inverse=True)
+        return ids, np.bincount(inverse, weights=contributions)
+
+    def candidates(self, query: str, limit: int) -> np.ndarray:
+        """Ids of up to limit best BM25 matches, best first"""
+        ids, values = self.score(query)
+        if len(ids) > limit:
+            keep = np.argpartition(-values, limit - 1)[:limit]
+            ids, values = ids[keep], values[keep]
+        return ids[np.argsort(-values, kind="stable")]
@@ -1,162 +1,264 @@
-from typing import Dict, List
-from llama_cpp import Llama
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from scripts.context_packer import ContextPacker
+from scripts.model_registry import get_llama
+from scripts.response_cache import ResponseCache
+
+# Saved KV states kept per context; one per recently used persona/task header
+MAX_PREFIX_STATES = 4
+# Tokens held back from the prompt budget for BOS and merges at the joins
+PROMPT_MARGIN_TOKENS = 8
+
+QUESTION = "\n\nWhat are the most relevant sections and insights?\n"
 
 class TinyLlamaGenerator:
-    def __init__(self, model_path: str = "./models/tinyllama-1.1b-chat-v1.0.Q6_K.gguf", n_ctx: int = 2048):
-        print("🧠 Loading TinyLLaMA GGUF...")
-        self.model = Llama(
-            model_path=model_path,
-            n_ctx=n_ctx,
-            n_threads=8,   # set based on your CPU
-            n_gpu_layers=0  # set to 0 for pure CPU
-        )
+    def __init__(
+        self,
+        model_path: str = "./models/tinyllama-1.1b-chat-v1.0.Q6_K.gguf",
+        n_ctx: int = 2048,
+        n_instances: int = 1,
+        n_threads: int = 8,   # total CPU threads, split across instances
+        seed: Optional[int] = None,
+        cache_dir: Optional[str] = "./cache",
+        cache_unseeded: bool = True,
+        embedder=None,
+    ):
+        """
+        Loads n_instances independent llama.cpp contexts and decodes up to that
+        many prompts at once. llama.cpp releases the GIL while decoding, so a
+        thread per instance gives real parallelism. With a fixed seed every call
+        samples the same way no matter which instance runs it.
+
+        Completions are cached under cache_dir (None disables the cache). Set
+        cache_unseeded=False to skip the cache when sampling is random, i.e.
+        temperature > 0 without a seed.
 
-    def generate_response(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512) -> str:
-        context_text = "\n".join([c["chunk_text"] for c in chunks])
+        Chunk text is packed to fit n_ctx - max_tokens using the model's own
+        tokenizer. Pass the MiniLMEmbedder as embedder to compress an
+        overflowing chunk down to its sentences closest to the query.
+        """
+        self.n_ctx = n_ctx
+        self.seed = seed
+        self.cache = ResponseCache(cache_dir, model_path) if cache_dir else None
+        self.cache_unseeded = cache_unseeded
+        threads_per_instance = max(1, n_threads // n_instances)
+        self.instances = [
+            get_llama(
+                model_path,
+                n_ctx=n_ctx,
+                n_threads=threads_per_instance,
+                n_gpu_layers=0,  # set to 0 for pure CPU
+                instance=instance,
+            )
+            for instance in range(n_instances)
+        ]
+        self.model = self.instances[0]
+        self.packer = ContextPacker(
+            tokenize=lambda text: self.model.tokenize(text.encode("utf-8"), add_bos=False, special=False),
+            detokenize=lambda tokens: self.model.detokenize(tokens).decode("utf-8", errors="ignore"),
+            encode=(lambda texts: embedder.encode_texts(texts, show_progress_bar=False)) if embedder else None,
+        )
+        self._models: "queue.Queue" = queue.Queue()
+        for model in self.instances:
+            self._models.put(model)
+        # Per-context LRU of header -> saved KV state; a context is only touched by
+        # the thread that borrowed it, so these need no extra locking
+        self._prefix_states = {id(model): OrderedDict() for model in self.instances}
+        self._executor = ThreadPoolExecutor(max_workers=n_instances, thread_name_prefix="llama")
 
-        prompt = f"""Role: {role}
+    def build_header(self, role: str, task: str) -> str:
+        """Persona/task header shared by every per-PDF prompt in a collection"""
+        return f"""Role: {role}
 Task: {task}
 Context:
-{context_text}
-
-What are the most relevant sections and insights?
 """
 
-        output = self.model(
-            prompt,
+    def build_prompt(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512,
+                     query_vector: Optional[np.ndarray] = None) -> str:
+        """Header, as much chunk text as fits beside max_tokens of output, and the question"""
+        header = self.build_header(role, task)
+        budget = (self.n_ctx - max_tokens - PROMPT_MARGIN_TOKENS
+                  - self.packer.count_tokens(header) - self.packer.count_tokens(QUESTION))
+        context_text = "\n".join(self.packer.pack(chunks, max(0, budget), query_vector=query_vector))
+
+        return f"{header}{context_text}{QUESTION}"
+
+    def _restore_header(self, model, header: str):
+        """Load the KV state for header, evaluating and saving it on first use.
+
+        llama.cpp skips prefill for the longest token prefix shared with the
+        tokens already in its context, so after the restore only the chunk
+        text and the closing question are evaluated.
+        """
+        states = self._prefix_states[id(model)]
+        state = states.get(header)
+        if state is None:
+            tokens = model.tokenize(header.encode("utf-8"), special=True)
+            if len(tokens) >= model.n_ctx():
+                return
+            model.reset()
+            model.eval(tokens)
+            state = model.save_state()
+            states[header] = state
+            if len(states) > MAX_PREFIX_STATES:
+                states.popitem(last=False)
+        else:
+            states.move_to_end(header)
+        model.load_state(state)
+
+    def sampling_params(self, max_tokens: int) -> Dict:
+        params = dict(
             max_tokens=max_tokens,
             temperature=0.7,
             top_p=0.9,
             stop=["</s>"],  # you can add more stop tokens if needed
         )
+        if self.seed is not None:
+            params["seed"] = self.seed
+        return params
+
+    def _cache_key(self, prompt: str, params: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        if not self.cache_unseeded and params["temperature"] > 0 and "seed" not in params:
+            return None
+        return self.cache.key(prompt, params)
+
+    def _prepare(self, role: str, task: str, chunks: List[Dict], max_tokens: int,
+                 query_vector: Optional[np.ndarray]) -> "GenerationStream":
+        prompt = self.build_prompt(role, task, chunks, max_tokens=max_tokens, query_vector=query_vector)
+        params = self.sampling_params(max_tokens)
+        return GenerationStream(self, self.build_header(role, task), prompt, params, self._cache_key(prompt, params))
+
+    def stream(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512,
+               query_vector: Optional[np.ndarray] = None) -> "GenerationStream":
+        """Return an iterator over the answer's text pieces as they are decoded.
+
+        Decoding runs in the iterating thread; call cancel() (from any thread)
+        to stop after the next token. Timings are in .metrics once done.
+        """
+        return self._prepare(role, task, chunks, max_tokens, query_vector)
+
+    def submit(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512,
+               query_vector: Optional[np.ndarray] = None,
+               on_metrics: Optional[Callable[[Dict], None]] = None) -> Future:
+        """Queue a generation and return a Future for its text; cache hits resolve immediately"""
+        stream = self._prepare(role, task, chunks, max_tokens, query_vector)
+
+        def run() -> str:
+            text = stream.read()
+            if on_metrics is not None:
+                on_metrics(stream.metrics)
+            return text
+
+        if stream.cached is not None:
+            future: Future = Future()
+            future.set_result(run())
+            return future
+        return self._executor.submit(run)
+
+    def generate_response(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512,
+                          query_vector: Optional[np.ndarray] = None) -> str:
+        return self.submit(role, task, chunks, max_tokens=max_tokens, query_vector=query_vector).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class GenerationStream:
+    """One completion, decoded token by token with stream=True.
+
+    Iterating yields text pieces as llama.cpp produces them; .text is the
+    final stripped answer, identical to the non-streaming result. A cached
+    answer is yielded as a single piece without touching the model.
+    """
+
+    def __init__(self, generator: TinyLlamaGenerator, header: str, prompt: str, params: Dict,
+                 cache_key: Optional[str]):
+        self.generator = generator
+        self.header = header
+        self.prompt = prompt
+        self.params = params
+        self.cache_key = cache_key
+        self.cached = generator.cache.get(cache_key) if cache_key is not None else None
+        self.text: Optional[str] = None
+        self.metrics: Dict = {}
+        self._cancelled = threading.Event()
+        self._started = False
+
+    def cancel(self):
+        """Stop decoding after the current token; the partial answer is kept but not cached"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def read(self) -> str:
+        """Consume the whole stream and return the final text"""
+        for _ in self:
+            pass
+        return self.text
+
+    def __iter__(self) -> Iterator[str]:
+        if self._started:
+            raise RuntimeError("A GenerationStream can only be iterated once")
+        self._started = True
+        start = time.perf_counter()
+
+        if self.cached is not None:
+            self.text = self.cached
+            self.metrics = {"cached": True, "cancelled": False, "prompt_tokens": 0, "completion_tokens": 0,
+                            "ttft_s": time.perf_counter() - start, "tokens_per_s": 0.0,
+                            "total_s": time.perf_counter() - start}
+            yield self.cached
+            return
+
+        pieces: List[str] = []
+        first_token_at = None
+        # Borrow whichever instance is free; blocks only if all are decoding
+        model = self.generator._models.get()
+        try:
+            prompt_tokens = len(model.tokenize(self.prompt.encode("utf-8"), special=True))
+            self.generator._restore_header(model, self.header)
+            completion = model(self.prompt, stream=True, **self.params)
+            try:
+                for chunk in completion:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    piece = chunk["choices"][0]["text"]
+                    pieces.append(piece)
+                    yield piece
+                    if self.cancelled:
+                        break
+            finally:
+                completion.close()
+            end = time.perf_counter()
+            raw_text = "".join(pieces)
+            # Chunks are not tokens: llama.cpp holds back partial UTF-8 characters and
+            # possible stop sequences and streams them merged, so count the text itself
+            completion_tokens = len(model.tokenize(raw_text.encode("utf-8"), add_bos=False, special=True))
+        finally:
+            self.generator._models.put(model)
 
-        return output["choices"][0]["text"].strip()
-
-
-# # ============= BATCH ========================
-# import threading
-# import queue
-# import atexit
-# from concurrent.futures import Future
-# from typing import List, Dict, Any
-
-# from llama_cpp import Llama
-
-# class TinyLlamaGenerator:
-#     """
-#     A generator class for TinyLLaMA that uses a transparent background worker
-#     to automatically batch requests for maximum throughput, without changing the
-#     public-facing API.
-#     """
-#     def __init__(
-#         self,
-#         model_path: str = "./models/tinyllama-1.1b-chat-v1.0.Q6_K.gguf",
-#         n_ctx: int = 2048,
-#         batch_size: int = 8,
-#         max_wait_time: float = 0.1
-#     ):
-#         """
-#         Initializes the model and the background batching worker.
-#         """
-#         print("🧠 Loading TinyLLaMA GGUF model...")
-#         self.model = Llama(
-#             model_path=model_path,
-#             n_ctx=n_ctx,
-#             n_threads=8,
-#             n_gpu_layers=0,
-#             n_batch=batch_size,
-#             verbose=False
-#         )
-#         print("✅ Model loaded successfully.")
-
-#         self.batch_size = batch_size
-#         self.max_wait_time = max_wait_time
-#         self.request_queue = queue.Queue()
-#         self.shutdown_event = threading.Event()
-
-#         self.worker_thread = threading.Thread(target=self._batch_worker, daemon=True)
-#         self.worker_thread.start()
-
-#         atexit.register(self.shutdown)
-
-#     def _create_prompt(self, role: str, task: str, context_text: str) -> str:
-#         """Helper function to create a consistently formatted prompt."""
-#         return f"""<|system|>
-# You are an expert assistant. Your role is {role}.</s>
-# <|user|>
-# Based on the following context, please perform this task: {task}.
-
-# Context:
-# ---
-# {context_text}
-# ---
-
-# Provide the most relevant sections and insights based on your role and task.</s>
-# <|assistant|>
-# """
-
-#     def _batch_worker(self):
-#         """The background worker loop that processes requests in batches."""
-#         while not self.shutdown_event.is_set():
-#             batch_requests = []
-#             try:
-#                 first_req = self.request_queue.get(timeout=self.max_wait_time)
-#                 batch_requests.append(first_req)
-
-#                 while len(batch_requests) < self.batch_size:
-#                     batch_requests.append(self.request_queue.get_nowait())
-#             except queue.Empty:
-#                 if not batch_requests:
-#                     continue
-
-#             prompts = [req['prompt'] for req in batch_requests]
-#             futures = [req['future'] for req in batch_requests]
-#             params = batch_requests[0]['params']
-
-#             try:
-#                 responses = []
-#                 for prompt in prompts:
-#                     output = self.model.create_completion(
-#                         prompt=prompt,
-#                         max_tokens=params.get('max_tokens', 512),
-#                         temperature=params.get('temperature', 0.7),
-#                         top_p=params.get('top_p', 0.9),
-#                         stop=params.get('stop', ["</s>", "<|user|>"]),
-#                     )
-#                     responses.append(output["choices"][0]["text"].strip())
-
-#                 for i, future in enumerate(futures):
-#                     future.set_result(responses[i])
-
-#             except Exception as e:
-#                 print(f"🔥 Error processing batch: {e}")
-#                 for future in futures:
-#                     future.set_exception(e)
-
-#     def generate_response(self, role: str, task: str, chunks: List[Dict], max_tokens: int = 512) -> str:
-#         """
-#         Generates a single response by adding the request to a batching queue
-#         and waiting for the result. The I/O of this method is unchanged.
-#         """
-#         context_text = "\n".join([c["chunk_text"] for c in chunks])
-#         prompt = self._create_prompt(role, task, context_text)
-        
-#         future = Future()
-        
-#         self.request_queue.put({
-#             "prompt": prompt,
-#             "future": future,
-#             "params": {
-#                 "max_tokens": max_tokens,
-#                 "temperature": 0.7,
-#                 "top_p": 0.9,
-#                 "stop": ["</s>", "<|user|>"],
-#             }
-#         })
-        
-#         return future.result()
-
-#     def shutdown(self):
-#         """Signals the background worker to shut down."""
-#         print("Shutting down batch worker...")
-#         self.shutdown_event.set()
\ No newline at end of file
+        decode_s = end - first_token_at if first_token_at is not None else 0.0
+        self.text = raw_text.strip()
+        self.metrics = {
+            "cached": False,
+            "cancelled": self.cancelled,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "ttft_s": (first_token_at or end) - start,
+            # Decode rate after the first token, so prefill time is not counted twice
+            "tokens_per_s": (completion_tokens - 1) / decode_s if completion_tokens > 1 and decode_s > 0 else 0.0,
+            "total_s": end - start,
+        }
+        if self.cache_key is not None and not self.cancelled:
+            self.generator.cache.put(self.cache_key, self.text)
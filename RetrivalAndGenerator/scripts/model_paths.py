@@ -0,0 +1,2 @@
+# Where the bundled models live, relative to the RetrivalAndGenerator directory
+DEFAULT_MODEL_PATH = "./models/all-MiniLM-L12-v2"
@@ -0,0 +1,122 @@
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# One instance per (kind, resolved path, settings) for the whole process
+_models: Dict[Tuple, Any] = {}
+_lock = threading.Lock()
+# Per-model locks for callers sharing a model across threads
+_encode_locks: Dict[int, threading.Lock] = {}
+# kind -> loader(model_path, **settings) used instead of the real library
+_overrides: Dict[str, Callable[..., Any]] = {}
+
+
+def _resolve(model_path: str) -> str:
+    path = Path(model_path)
+    # Hub ids such as "all-MiniLM-L12-v2" are not local paths; key them as given
+    return str(path.resolve()) if path.exists() else str(model_path)
+
+
+def _get_or_load(key: Tuple, loader: Callable[[], Any]) -> Any:
+    with _lock:
+        if key not in _models:
+            _models[key] = loader()
+        return _models[key]
+
+
+def override_loader(kind: str, loader: Optional[Callable[..., Any]]):
+    """Build models of kind ("sentence_transformer" or "llama") with loader(model_path, **settings)
+    instead of the real library, e.g. tiny stand-ins for CI benchmarks; None restores the default.
+    Already loaded models of that kind are dropped.
+    """
+    with _lock:
+        if loader is None:
+            _overrides.pop(kind, None)
+        else:
+            _overrides[kind] = loader
+        for key in [k for k in _models if k[0] == kind]:
+            del _models[key]
+
+
+def get_sentence_transformer(model_path: str = "./models/all-MiniLM-L12-v2", backend: str = "torch",
+                             threads: Optional[int] = None):
+    """Return the process-wide SentenceTransformer for model_path and backend, loading it once.
+
+    backend "onnx" (int8 ONNX Runtime) or "torchscript" returns an exported
+    copy with the same encode() (scripts.inference_backend), exported on first
+    use; PyTorch is used instead, with a warning, when the export cannot be
+    made or fails its parity check. threads caps an exported model's
+    inference threads (PyTorch's are set process-wide with torch.set_num_threads).
+    """
+    def load_torch():
+        from sentence_transformers import SentenceTransformer
+        print(f"🧠 Loading SentenceTransformer from {model_path}...")
+        return SentenceTransformer(model_path)
+
+    def load():
+        if "sentence_transformer" in _overrides:
+            return _overrides["sentence_transformer"](model_path)
+        if backend != "torch":
+            from scripts.inference_backend import load_exported
+            try:
+                return load_exported(model_path, backend, load_torch, threads=threads)
+            except (ImportError, OSError, RuntimeError, ValueError) as e:
+                print(f"⚠️ {backend} backend unavailable ({type(e).__name__}: {e}); using PyTorch")
+        return load_torch()
+
+    return _get_or_load(("sentence_transformer", _resolve(model_path), backend, threads), load)
+
+
+def get_encode_lock(model) -> threading.Lock:
+    """Lock serializing encode() calls on a shared SentenceTransformer.
+
+    Its fast tokenizer is not safe to call from two threads at once, which
+    happens when pipeline stages or server requests overlap.
+    """
+    with _lock:
+        return _encode_locks.setdefault(id(model), threading.Lock())
+
+
+class LockedModel:
+    """A shared SentenceTransformer for code that calls encode() itself, e.g. HeadingExtractor.
+
+    encode() holds the model's encode lock; everything else is the model's own.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._encode_lock = get_encode_lock(model)
+
+    def encode(self, *args, **kwargs):
+        with self._encode_lock:
+            return self._model.encode(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def get_llama(
+    model_path: str = "./models/tinyllama-1.1b-chat-v1.0.Q6_K.gguf",
+    n_ctx: int = 2048,
+    n_threads: int = 8,
+    n_gpu_layers: int = 0,
+    instance: int = 0,
+):
+    """Return the process-wide llama.cpp model for model_path and settings, loading it once.
+
+    Distinct `instance` numbers give independent contexts for parallel decoding;
+    the weights are memory-mapped, so extra instances mostly cost KV cache.
+    """
+    def load():
+        if "llama" in _overrides:
+            return _overrides["llama"](model_path, n_ctx=n_ctx, n_threads=n_threads, n_gpu_layers=n_gpu_layers)
+        from llama_cpp import Llama
+        print("🧠 Loading TinyLLaMA GGUF...")
+        return Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            n_gpu_layers=n_gpu_layers,
+        )
+
+    return _get_or_load(("llama", _resolve(model_path), n_ctx, n_threads, n_gpu_layers, instance), load)
@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from scripts import tracing
+from scripts.parse_pdf import iter_pdf_pages, parse_pdf_to_pages
+from scripts.chunk_text import get_chunker, iter_page_chunks
+
+# Workers are started with "spawn": this process runs threads (the server, PyTorch's
+# thread pool) by the time it parses, and forking a threaded process can deadlock
+_CONTEXT = multiprocessing.get_context("spawn")
+# One pool, kept across collections so spawned workers pay their imports once
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+class PackedChunks(NamedTuple):
+    """One PDF's chunks as flat arrays plus a single string, cheap to pickle between processes"""
+    pdf_name: str
+    page_numbers: np.ndarray
+    chunk_indices: np.ndarray
+    text: str  # the page texts, concatenated; overlapping chunks share it
+    spans: np.ndarray  # chunk i is text[spans[i, 0]:spans[i, 1]]
+
+
+def pack_pages(pdf_name: str, pages: List[Dict]) -> PackedChunks:
+    """Chunk the pages, keeping only each chunk's offsets into the joined page text"""
+    chunker = get_chunker()
+    page_numbers, chunk_indices, spans = [], [], []
+    base = 0
+    for page in pages:
+        for i, (start, end) in enumerate(chunker.split(page["text"])):
+            page_numbers.append(page["page_number"])
+            chunk_indices.append(i)
+            spans.append((base + start, base + end))
+        base += len(page["text"])
+    return PackedChunks(
+        pdf_name=pdf_name,
+        page_numbers=np.array(page_numbers, dtype=np.int32),
+        chunk_indices=np.array(chunk_indices, dtype=np.int32),
+        text="".join(page["text"] for page in pages),
+        spans=np.array(spans, dtype=np.int64).reshape(-1, 2),
+    )
+
+
+def unpack_chunks(packed: PackedChunks) -> List[Dict]:
+    return [
+        {
+            "pdf_name": packed.pdf_name,
+            "page_number": page,
+            "chunk_index": index,
+            "chunk_text": packed.text[start:end],
+        }
+        for page, index, (start, end) in zip(packed.page_numbers.tolist(), packed.chunk_indices.tolist(),
+                                             packed.spans.tolist())
+    ]
+
+
+def _parse_and_chunk(pdf_path: str) -> Tuple[Optional[PackedChunks], Optional[str]]:
+    """Worker: parse and chunk one PDF, returning an error string instead of raising"""
+    path = Path(pdf_path)
+    try:
+        packed = pack_pages(path.name, parse_pdf_to_pages(path))
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return packed, None
+
+
+def parse_and_chunk_pdfs(pdf_paths: List[Path], workers: Optional[int] = None) -> Iterator[Optional[Iterable[Dict]]]:
+    """Parse and chunk PDFs across a process pool, yielding each PDF's chunks.
+
+    Results are yielded in the order of pdf_paths, with at most two PDFs per
+    worker in flight so finished work does not pile up in memory. A PDF that
+    fails (or crashes its worker) yields None instead of aborting the rest of
+    the collection. With a single worker the chunks of each PDF are produced
+    lazily, page by page, in this process, and the page parsing is traced as
+    "parse". The worker pool is started on first
+    use and reused by later calls; close_pool() stops it.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(pdf_paths))
+    if workers <= 1:
+        for path in pdf_paths:
+            yield iter_page_chunks(tracing.current().timed_iter("parse", iter_pdf_pages(path), counter="pages"))
+        return
+
+    for path, (packed, error) in zip(pdf_paths, _run_pool([str(p) for p in pdf_paths], workers)):
+        if error is not None:
+            tracing.log(f"⚠️ Skipping {path.name}: {error}", error=error)
+            yield None
+        else:
+            yield unpack_chunks(packed)
+
+
+def _get_pool(workers: int, broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """The shared pool, (re)started when it has a different size or is the broken one given"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool is broken or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_CONTEXT)
+            _pool_workers = workers
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _run_pool(paths: List[str], workers: int) -> Iterator[Tuple[Optional[PackedChunks], Optional[str]]]:
+    window = workers * 2
+    pool = _get_pool(workers)
+    pending: Deque = deque()
+    submitted = 0
+    try:
+        for i in range(len(paths)):
+            while submitted < len(paths) and len(pending) < window:
+                pending.append(pool.submit(_parse_and_chunk, paths[submitted]))
+                submitted += 1
+            try:
+                yield pending.popleft().result()
+            except BrokenProcessPool:
+                # A worker died hard (e.g. a native crash inside the PDF library) and took
+                # the pool down. Retry this PDF on its own so only the culprit fails, then
+                # resubmit everything after it to a fresh pool.
+                yield _run_isolated(paths[i])
+                pool = _get_pool(workers, broken=pool)
+                pending.clear()
+                submitted = i + 1
+    finally:
+        # Stopped early: drop this call's queued PDFs but keep the pool for the next
+        for future in pending:
+            future.cancel()
+
+
+def _run_isolated(path: str) -> Tuple[Optional[PackedChunks], Optional[str]]:
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=_CONTEXT) as pool:
+            return pool.submit(_parse_and_chunk, path).result()
+    except BrokenProcessPool:
+        return None, "worker process crashed"
@@ -1,17 +1,17 @@
-import fitz  # PyMuPDF
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator
+
+def iter_pdf_pages(pdf_path: Path) -> Iterator[Dict]:
+    """Yield the text of each page in the PDF, one page at a time"""
+    import fitz  # PyMuPDF; imported here so commands that never parse skip it
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            yield {
+                "pdf_name": pdf_path.name,
+                "page_number": i,
+                "text": page.get_text("text").strip()
+            }
 
 def parse_pdf_to_pages(pdf_path: Path) -> List[Dict]:
     """Extract text from each page in the PDF"""
-    doc = fitz.open(pdf_path)
-    pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text("text")
-        pages.append({
-            "pdf_name": pdf_path.name,
-            "page_number": i,
-            "text": text.strip()
-        })
-    doc.close()
-    return pages
+    return list(iter_pdf_pages(pdf_path))
@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    name: str
+    run: Callable[[Any], Any]
+
+
+class StageResult(NamedTuple):
+    item: Any
+    failed_stage: Optional[str]
+    error: Optional[BaseException]
+
+
+def run_pipeline(items: List[Any], stages: List[Stage], queue_size: int = 1) -> Tuple[List[StageResult], Dict]:
+    """Run every item through the stages in order, one thread per stage.
+
+    Stages are connected by queues holding at most queue_size items, so while
+    a slow stage works on one item the earlier stages can work ahead on the
+    next ones without piling up results in memory. Each stage handles items in
+    arrival order, so results come back in the order of items. An item whose
+    stage raises skips the remaining stages and is reported with its error.
+
+    Returns the results and per-stage timings ({stage: busy seconds} plus
+    "wall_s" for the whole run).
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    queues[-1] = queue.Queue()  # results are collected after all stages finish
+    busy = {stage.name: 0.0 for stage in stages}
+
+    def worker(stage: Stage, inbox: queue.Queue, outbox: queue.Queue):
+        while True:
+            message = inbox.get()
+            if message is _DONE:
+                outbox.put(_DONE)
+                return
+            item, failed_stage, error = message
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    item = stage.run(item)
+                except Exception as e:
+                    failed_stage, error = stage.name, e
+                busy[stage.name] += time.perf_counter() - start
+            outbox.put(StageResult(item, failed_stage, error))
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(stage, queues[i], queues[i + 1]), name=f"stage-{stage.name}", daemon=True)
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    for item in items:
+        queues[0].put(StageResult(item, None, None))  # blocks while the first stage is backed up
+    queues[0].put(_DONE)
+
+    results = []
+    while True:
+        message = queues[-1].get()
+        if message is _DONE:
+            break
+        results.append(message)
+    for thread in threads:
+        thread.join()
+    return results, {**busy, "wall_s": time.perf_counter() - start}
@@ -0,0 +1,98 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+PRECISIONS = ("float32", "int8", "binary")
+
+# Set bits per byte value, for numpy versions without np.bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+# Rows scored per step, so the float32 (or XOR) temporaries of a block stay in cache
+_BLOCK_ROWS = 1024
+# From this many queries, binary rows are unpacked to +-1 and scored with one BLAS
+# matmul per block; below it, XOR and popcount per (query, row) pair is cheaper
+_UNPACK_MIN_QUERIES = 32
+
+
+class QuantizedVectors(NamedTuple):
+    """Compressed embedding rows.
+
+    int8: codes are round(v / scale) with one float32 scale per row (~4x
+    smaller than float32). binary: codes are the sign bits of each row packed
+    into uint64 words (32x smaller) and scales is None.
+    """
+    precision: str
+    codes: np.ndarray
+    scales: Optional[np.ndarray]
+    dim: int
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+
+def quantize(vectors: np.ndarray, precision: str) -> QuantizedVectors:
+    """Quantize unit-length rows to int8 codes or packed sign bits"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if precision == "int8":
+        # Symmetric per-row scale: needs no corpus-wide calibration, so rows can be added in batches
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return QuantizedVectors("int8", codes, scales.astype(np.float32), vectors.shape[1])
+    if precision == "binary":
+        return QuantizedVectors("binary", pack_signs(vectors), None, vectors.shape[1])
+    raise ValueError(f"Unknown precision '{precision}', expected 'int8' or 'binary'")
+
+
+def pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each row packed into uint64 words (zero padded), so Hamming
+    distance is an XOR and popcount over dim / 64 words"""
+    bits = np.packbits(vectors > 0, axis=1)
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Set bits of each element; without np.bitwise_count, of each byte (the sums along the last axis agree)"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits.view(np.uint8)]
+
+
+def approximate_scores(queries: np.ndarray, vectors: QuantizedVectors) -> np.ndarray:
+    """First-pass similarity of float32 queries against quantized rows (higher is better).
+
+    int8 gives the approximate inner product; binary gives dim minus the Hamming
+    distance between sign patterns, which only ranks rows and must be rescored.
+    Rows are scored a block at a time; int8 codes are widened to float32 per
+    block for a BLAS matmul, never as a whole.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n = len(vectors.codes)
+    scores = np.empty((len(queries), n), dtype=np.float32)
+    if vectors.precision == "int8":
+        block = np.empty((min(n, _BLOCK_ROWS), vectors.dim), dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            codes = vectors.codes[start:start + _BLOCK_ROWS]
+            np.copyto(block[:len(codes)], codes, casting="unsafe")
+            np.matmul(queries, block[:len(codes)].T, out=scores[:, start:start + len(codes)])
+        scores *= vectors.scales
+        return scores
+
+    if len(queries) >= _UNPACK_MIN_QUERIES:
+        signs = np.where(queries > 0, 1.0, -1.0).astype(np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            bits = np.unpackbits(vectors.codes[start:start + _BLOCK_ROWS].view(np.uint8), axis=1, count=vectors.dim)
+            np.matmul(signs, (bits.astype(np.float32) * 2 - 1).T, out=scores[:, start:start + len(bits)])
+        # (agreeing - disagreeing bits + dim) / 2 = agreeing bits = dim - Hamming distance
+        scores += vectors.dim
+        scores /= 2
+        return scores
+
+    query_bits = pack_signs(queries)
+    for start in range(0, n, _BLOCK_ROWS):
+        codes = vectors.codes[start:start + _BLOCK_ROWS]
+        differing = popcount(np.bitwise_xor(query_bits[:, None, :], codes[None, :, :]))
+        scores[:, start:start + len(codes)] = differing.sum(axis=2, dtype=np.int32)
+    return np.subtract(vectors.dim, scores, out=scores)
@@ -0,0 +1,31 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional
+
+from scripts.disk_cache import DiskCache
+from scripts.embedding_cache import model_fingerprint
+
+
+class ResponseCache:
+    """On-disk cache of LLM completions keyed by model, prompt and sampling parameters"""
+
+    def __init__(self, cache_dir: str, model_path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.model_id = model_fingerprint(model_path)
+        self.store = DiskCache(Path(cache_dir) / "responses.sqlite", max_bytes=max_bytes)
+
+    def key(self, prompt: str, params: Dict) -> str:
+        # sort_keys makes the hash independent of parameter order
+        payload = json.dumps({"model": self.model_id, "prompt": prompt, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put(self, key: str, text: str):
+        self.store.set(key, text.encode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.stats()
@@ -1,33 +1,110 @@
 import numpy as np
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Optional
+
+from scripts.lexical_index import BM25Index
+from scripts.model_paths import DEFAULT_MODEL_PATH
+from scripts.model_registry import get_encode_lock, get_sentence_transformer
+from scripts.vector_index import build_index, top_k_indices
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a contiguous float32 copy of vectors with every row scaled to unit length"""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
 
 class SemanticSearcher:
-    def __init__(self, embedded_chunks: List[Dict], model_path: str = "./models/all-MiniLM-L12-v2"):
+    def __init__(self, embedded_chunks: List[Dict], model_path: str = DEFAULT_MODEL_PATH,
+                 embeddings: Optional[np.ndarray] = None, index: str = "exact",
+                 index_params: Optional[Dict] = None, normalized: bool = False,
+                 prefilter: Optional[str] = None, n_candidates: int = 512, min_candidates: int = 50,
+                 backend: str = "torch"):
+        """
+        prefilter="bm25" builds an inverted index over the chunk texts; a query
+        then scores only its n_candidates best lexical matches densely, and
+        falls back to the full index when fewer than min_candidates (or top_k)
+        chunks share a term with it. Queries are encoded with the given
+        model backend, which should match the one that embedded the chunks.
+        """
         self.embedded_chunks = embedded_chunks
-        self.model = SentenceTransformer(model_path)
+        self.model = get_sentence_transformer(model_path, backend=backend)
+
+        # Build the normalized float32 matrix once so a query is a single matmul
+        if embeddings is None:
+            if embedded_chunks:
+                embeddings = np.stack([chunk["embedding"] for chunk in embedded_chunks])
+            else:
+                embeddings = np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Already unit-length rows (e.g. a memory-mapped CorpusStore) are used as-is, not copied
+        self.embedding_matrix = embeddings if normalized else normalize_rows(embeddings)
+        # "exact" scans every row; "ivf" scans only the closest k-means buckets;
+        # "int8" / "binary" scan compressed codes and rescore a shortlist
+        self.index = build_index(self.embedding_matrix, index, **(index_params or {}))
+        if prefilter not in (None, "bm25"):
+            raise ValueError(f"Unknown prefilter '{prefilter}', expected None or 'bm25'")
+        self.lexical = BM25Index(chunk["chunk_text"] for chunk in embedded_chunks) if prefilter else None
+        self.n_candidates = n_candidates
+        self.min_candidates = min_candidates
 
-        # Build embedding matrix
-        self.embedding_matrix = np.array([chunk["embedding"] for chunk in embedded_chunks])
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        with get_encode_lock(self.model):
+            return normalize_rows(self.model.encode(queries, convert_to_numpy=True))
 
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """Search for the most relevant chunks for a query"""
-        query_vec = self.model.encode([query], convert_to_numpy=True)[0]
-
-        # Cosine similarity
-        dot_product = np.dot(self.embedding_matrix, query_vec)
-        norm_product = np.linalg.norm(self.embedding_matrix, axis=1) * np.linalg.norm(query_vec)
-        scores = dot_product / norm_product
-
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        results = []
-        for idx in top_indices:
-            chunk = self.embedded_chunks[idx]
-            results.append({
-                "score": float(scores[idx]),
-                "pdf_name": chunk["pdf_name"],
-                "page_number": chunk["page_number"],
-                "chunk_index": chunk["chunk_index"],
-                "chunk_text": chunk["chunk_text"]
-            })
-        return results
+        return self.search_batch([query], top_k=top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """Score many queries against the collection in one matrix product"""
+        if not queries:
+            return []
+        return self.search_vectors(self.encode_queries(queries), top_k=top_k, queries=queries)
+
+    def search_vectors(self, query_matrix: np.ndarray, top_k: int = 5,
+                       queries: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Search with already encoded, unit-length query rows; pass the query texts to use the prefilter"""
+        # Rows are unit length, so the inner product is the cosine similarity
+        if self.lexical is None or queries is None:
+            scores, ids = self.index.search(query_matrix, top_k)
+        else:
+            scores, ids = self._search_prefiltered(query_matrix, queries, top_k)
+        return [
+            [self._result(idx, score) for score, idx in zip(row_scores, row_ids) if idx >= 0]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+    def _search_prefiltered(self, query_matrix: np.ndarray, queries: List[str], top_k: int):
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), top_k), -1, dtype=np.int64)
+        fallback = []
+        for row, query in enumerate(queries):
+            candidates = self.lexical.candidates(query, max(self.n_candidates, top_k))
+            if len(candidates) < max(self.min_candidates, top_k):
+                fallback.append(row)
+                continue
+            # Sorted ids read the (possibly memory-mapped) matrix front to back
+            candidates = np.sort(candidates)
+            candidate_scores = np.asarray(self.embedding_matrix[candidates], dtype=np.float32) @ query_matrix[row]
+            best = top_k_indices(candidate_scores, top_k)[0]
+            scores[row, :len(best)] = candidate_scores[best]
+            ids[row, :len(best)] = candidates[best]
+        if fallback:
+            scores[fallback], ids[fallback] = self.index.search(query_matrix[fallback], top_k)
+        return scores, ids
+
+    def _result(self, idx: int, score: float) -> Dict:
+        chunk = self.embedded_chunks[idx]
+        result = {
+            "score": float(score),
+            "pdf_name": chunk["pdf_name"],
+            "page_number": chunk["page_number"],
+            "chunk_index": chunk["chunk_index"],
+            "chunk_text": chunk["chunk_text"]
+        }
+        # Collapsed duplicates (scripts.dedup) list every (pdf, page) the text appears on
+        if "occurrences" in chunk:
+            result["occurrences"] = chunk["occurrences"]
+        return result
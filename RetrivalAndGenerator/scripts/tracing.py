@@ -0,0 +1,266 @@
+# Identical copies live in RetrivalAndGenerator/scripts and HeadingExtractor/src, which are
+# built as separate containers; `python -m benchmarks.shared_modules` checks they match
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Tracer receiving span(), count() and log() calls made in this context
+_current: contextvars.ContextVar = contextvars.ContextVar("tracer", default=None)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+class Tracer:
+    """Spans, counters and log events for one unit of work (a collection or a PDF).
+
+    Spans record wall time, CPU time of the calling thread and peak RSS, and
+    nest per thread. Stages named in `profile` also run under cProfile; their
+    top functions by cumulative time are kept on the span. Export with
+    to_json() / to_chrome_trace() or write().
+    """
+
+    def __init__(self, name: str, profile: Iterable[str] = (), echo: bool = True, verbose: bool = False):
+        self.name = name
+        self.profile = set(profile)
+        self.echo = echo
+        self.verbose = verbose
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.events: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self.profiles: Dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+        self._stack = threading.local()
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._t0
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        stack = self._stack.__dict__.setdefault("spans", [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        profiler = cProfile.Profile() if name in self.profile else None
+        start, cpu = self._now(), time.thread_time()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is already active (e.g. a profiled parent span)
+                profiler = None
+        try:
+            yield attrs
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record = {
+                "name": name,
+                "start_s": start,
+                "wall_s": self._now() - start,
+                "cpu_s": time.thread_time() - cpu,
+                "peak_rss_mb": peak_rss_mb(),
+                "thread": threading.current_thread().name,
+                "parent": parent,
+                "attrs": attrs,
+            }
+            stack.pop()
+            if profiler is not None:
+                record["profile"] = self._profile_summary(name, profiler)
+            with self._lock:
+                self.spans.append(record)
+
+    def _profile_summary(self, name: str, profiler: cProfile.Profile, top: int = 15) -> List[Dict]:
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        with self._lock:
+            if name in self.profiles:
+                self.profiles[name].add(stats)
+            else:
+                self.profiles[name] = stats
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        return [
+            {"function": f"{path}:{line}({func})", "calls": calls, "tottime_s": tottime, "cumtime_s": cumtime}
+            for (path, line, func), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+    def timed_iter(self, name: str, iterable: Iterable, counter: Optional[str] = None) -> Iterator:
+        """Yield from iterable, recording the time spent producing items as one span.
+
+        Time spent in a timed_iter that iterable itself pulls from (e.g. pages
+        parsed lazily while chunking) is recorded there, not here.
+        """
+        wall = cpu = 0.0
+        items = 0
+        start = self._now()
+        iterator = iter(iterable)
+        # (wall, cpu) of timed_iters nested inside the next() calls in progress on this thread
+        nested = self._stack.__dict__.setdefault("timed_iters", [])
+        try:
+            while True:
+                t, c = time.perf_counter(), time.thread_time()
+                nested.append([0.0, 0.0])
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    inner_wall, inner_cpu = nested.pop()
+                    step_wall, step_cpu = time.perf_counter() - t, time.thread_time() - c
+                    wall += step_wall - inner_wall
+                    cpu += step_cpu - inner_cpu
+                    if nested:
+                        nested[-1][0] += step_wall
+                        nested[-1][1] += step_cpu
+                items += 1
+                yield item
+        finally:
+            if counter:
+                self.count(counter, items)
+            with self._lock:
+                self.spans.append({"name": name, "start_s": start, "wall_s": wall, "cpu_s": cpu,
+                                   "peak_rss_mb": peak_rss_mb(), "thread": threading.current_thread().name,
+                                   "parent": None, "attrs": {"items": items, "accumulated": True}})
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def log(self, message: str, verbose: bool = False, **fields):
+        """Record a progress event; printed unless it is verbose detail and verbose is off"""
+        with self._lock:
+            self.events.append({"t_s": self._now(), "message": message, **fields})
+        if self.echo and (self.verbose or not verbose):
+            print(message)
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            total["calls"] += 1
+            total["wall_s"] += span["wall_s"]
+            total["cpu_s"] += span["cpu_s"]
+        return totals
+
+    def to_json(self) -> Dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "wall_s": self._now(),
+            "peak_rss_mb": peak_rss_mb(),
+            "counters": dict(self.counters),
+            "stages": self.stage_totals(),
+            "spans": sorted(self.spans, key=lambda s: s["start_s"]),
+            "events": list(self.events),
+        }
+
+    def to_chrome_trace(self) -> Dict:
+        """Trace Event Format, loadable in chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        threads: Dict[str, int] = {}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s["start_s"]):
+            tid = threads.setdefault(span["thread"], len(threads) + 1)
+            events.append({"name": span["name"], "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+                           "ts": span["start_s"] * 1e6, "dur": span["wall_s"] * 1e6,
+                           "args": {"cpu_s": span["cpu_s"], **span["attrs"]}})
+        for event in self.events:
+            events.append({"name": event["message"], "cat": "log", "ph": "i", "s": "p", "pid": pid, "tid": 0,
+                           "ts": event["t_s"] * 1e6})
+        events.append({"name": "counters", "ph": "C", "pid": pid, "tid": 0, "ts": self._now() * 1e6,
+                       "args": dict(self.counters)})
+        events.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                      for name, tid in threads.items())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, out_dir: Path, chrome: bool = False) -> Path:
+        """Write <name>.trace.json (and .chrome.json / per-stage .prof files) to out_dir"""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{self.name}.trace.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, default=str)
+        if chrome:
+            with open(out_dir / f"{self.name}.chrome.json", "w", encoding="utf-8") as f:
+                json.dump(self.to_chrome_trace(), f, default=str)
+        for stage, stats in self.profiles.items():
+            stats.dump_stats(str(out_dir / f"{self.name}.{stage}.prof"))
+        return path
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {total['wall_s']:.2f}s" for name, total in self.stage_totals().items())
+        return f"{self.name}: {self._now():.2f}s total, peak RSS {peak_rss_mb():.0f} MB ({stages})"
+
+
+class _NullTracer(Tracer):
+    """Used when no tracer is active: prints progress as before and records nothing"""
+
+    def __init__(self):
+        super().__init__("untraced", echo=True, verbose=True)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        yield attrs
+
+    def timed_iter(self, name: str, iterable: Iterable, counter: Optional[str] = None) -> Iterator:
+        return iter(iterable)
+
+    def count(self, name: str, value: float = 1):
+        pass
+
+    def log(self, message: str, verbose: bool = False, **fields):
+        print(message)
+
+
+_NULL = _NullTracer()
+
+
+def current() -> Tracer:
+    return _current.get() or _NULL
+
+
+@contextlib.contextmanager
+def use_tracer(tracer: Optional[Tracer]):
+    """Route span(), count() and log() in this thread/context to tracer"""
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+
+def span(name: str, **attrs):
+    return current().span(name, **attrs)
+
+
+def count(name: str, value: float = 1):
+    current().count(name, value)
+
+
+def log(message: str, verbose: bool = False, **fields):
+    current().log(message, verbose=verbose, **fields)
+
+
+def tracer_from_env(name: str) -> Tracer:
+    """Tracer configured by TRACE_PROFILE (comma-separated stages to cProfile) and TRACE_VERBOSE=1"""
+    profile = [s.strip() for s in os.environ.get("TRACE_PROFILE", "").split(",") if s.strip()]
+    return Tracer(name, profile=profile, verbose=os.environ.get("TRACE_VERBOSE") == "1")
+
+
+def export_from_env(tracer: Tracer):
+    """Write the trace to TRACE_DIR if it is set, with TRACE_CHROME=1 for Chrome format"""
+    out_dir = os.environ.get("TRACE_DIR")
+    if out_dir:
+        tracer.write(Path(out_dir), chrome=os.environ.get("TRACE_CHROME") == "1")
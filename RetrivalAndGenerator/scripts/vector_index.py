@@ -0,0 +1,254 @@
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from scripts.quantization import QuantizedVectors, approximate_scores, quantize
+
+# Rows converted to float32 and scored at a time when the matrix is stored in
+# another dtype (e.g. a float16 memory map), so it is never upcast all at once
+_SCORE_BLOCK = 65536
+
+
+class VectorIndex(ABC):
+    """Nearest-neighbour index over unit-length float32 rows, scored by inner product"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, ids) of shape (n_queries, top_k), best first.
+
+        Slots that could not be filled hold id -1 and score -inf.
+        """
+
+
+def _empty_results(n_queries: int, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return (
+        np.full((n_queries, top_k), -np.inf, dtype=np.float32),
+        np.full((n_queries, top_k), -1, dtype=np.int64),
+    )
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k scores in each row, best first, without a full sort"""
+    scores = np.atleast_2d(scores)
+    k = min(top_k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force search: one matmul against every row"""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        out_scores, out_ids = _empty_results(len(queries), top_k)
+        if len(self.vectors) == 0 or top_k <= 0:
+            return out_scores, out_ids
+        scores = score_blocks(queries, self.vectors)
+        best = top_k_indices(scores, top_k)
+        out_scores[:, :best.shape[1]] = np.take_along_axis(scores, best, axis=1)
+        out_ids[:, :best.shape[1]] = best
+        return out_scores, out_ids
+
+
+def score_blocks(queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """queries @ vectors.T, converting non-float32 vectors block by block"""
+    if vectors.dtype == np.float32:
+        return queries @ vectors.T
+    return np.concatenate([
+        queries @ np.asarray(vectors[start:start + _SCORE_BLOCK], dtype=np.float32).T
+        for start in range(0, len(vectors), _SCORE_BLOCK)
+    ], axis=1)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity and return unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=n_clusters)
+        # Re-seed empty clusters from random points so every list stays useful
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+
+def build_ivf_lists(vectors: np.ndarray, n_lists: Optional[int] = None, train_size: int = 64,
+                    n_iter: int = 10, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Train IVF centroids and group the rows by list, as arrays that can be saved and memory-mapped.
+
+    "vectors" holds the rows as float16, reordered so each list is one
+    contiguous slice offsets[i]:offsets[i + 1]; "ids" maps them back to rows.
+    """
+    n, dim = vectors.shape
+    if n == 0:
+        return {"centroids": np.empty((0, dim), dtype=np.float32), "ids": np.empty(0, dtype=np.int64),
+                "offsets": np.zeros(1, dtype=np.int64), "vectors": np.empty((0, dim), dtype=np.float16)}
+    n_lists = max(1, min(n, n_lists or int(math.sqrt(n))))
+
+    # Train on a sample of train_size points per list to keep build cost bounded
+    rng = np.random.default_rng(seed)
+    sample_size = min(n, n_lists * train_size)
+    sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))] if sample_size < n else vectors
+    centroids = spherical_kmeans(np.asarray(sample, dtype=np.float32), n_lists, n_iter=n_iter, seed=seed)
+
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, _SCORE_BLOCK):
+        block = np.asarray(vectors[start:start + _SCORE_BLOCK], dtype=np.float32)
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    ids = np.argsort(assign, kind="stable")
+    grouped = np.empty((n, dim), dtype=np.float16)
+    for start in range(0, n, _SCORE_BLOCK):
+        grouped[start:start + _SCORE_BLOCK] = vectors[ids[start:start + _SCORE_BLOCK]]
+    counts = np.bincount(assign, minlength=n_lists)
+    return {"centroids": centroids, "ids": ids, "offsets": np.concatenate([[0], np.cumsum(counts)]),
+            "vectors": grouped}
+
+
+class IVFFlatIndex(VectorIndex):
+    """Inverted-file index: rows are bucketed by nearest k-means centroid and a
+    query scans only the n_probe closest buckets.
+
+    n_lists trades build time for scan size (default ~sqrt(n)); n_probe trades
+    latency for recall and can be changed after the index is built. Pass lists
+    from build_ivf_lists (e.g. saved with a CorpusStore) to skip training.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: Optional[int] = None, n_probe: int = 8,
+                 train_size: int = 64, n_iter: int = 10, seed: int = 0,
+                 lists: Optional[Dict[str, np.ndarray]] = None):
+        if lists is None:
+            lists = build_ivf_lists(vectors, n_lists, train_size=train_size, n_iter=n_iter, seed=seed)
+        self.centroids = np.asarray(lists["centroids"], dtype=np.float32)
+        self.ids = lists["ids"]
+        self.offsets = lists["offsets"]
+        # float16 rows grouped by list; each probed slice is converted on its own
+        self.vectors = lists["vectors"]
+        self.n_lists = len(self.centroids)
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        out_scores, out_ids = _empty_results(len(queries), top_k)
+        if len(self.ids) == 0 or top_k <= 0:
+            return out_scores, out_ids
+        centroid_scores = queries @ self.centroids.T
+        for row, query in enumerate(queries):
+            lists = np.argsort(-centroid_scores[row])
+            # Probe at least n_probe lists, and more if they hold fewer than top_k rows
+            probed, size = [], 0
+            for lst in lists:
+                if len(probed) >= self.n_probe and size >= top_k:
+                    break
+                probed.append(slice(self.offsets[lst], self.offsets[lst + 1]))
+                size += self.offsets[lst + 1] - self.offsets[lst]
+            # Score each bucket as a contiguous slice to avoid gathering rows
+            positions = np.concatenate([np.arange(s.start, s.stop) for s in probed])
+            scores = np.concatenate([np.asarray(self.vectors[s], dtype=np.float32) @ query for s in probed])
+            best = top_k_indices(scores, top_k)[0]
+            out_scores[row, :len(best)] = scores[best]
+            out_ids[row, :len(best)] = self.ids[positions[best]]
+        return out_scores, out_ids
+
+
+_RESCORE_FACTORS = {"int8": 4, "binary": 20}
+
+
+class QuantizedIndex(VectorIndex):
+    """Brute-force first pass over int8 or binary codes, then exact rescoring.
+
+    Only the codes are held in memory; the original rows are read back for the
+    rescore_factor * top_k shortlist alone, so with a memory-mapped float16
+    CorpusStore the full matrix never has to be resident. rescore=False
+    returns the approximate scores directly.
+    """
+
+    def __init__(self, vectors: np.ndarray, precision: str = "int8", rescore: bool = True,
+                 rescore_factor: Optional[int] = None, min_shortlist: int = 100):
+        self.vectors = vectors
+        self.rescore = rescore
+        # Sign bits rank far more coarsely than int8, so binary needs a longer shortlist
+        self.rescore_factor = rescore_factor or _RESCORE_FACTORS[precision]
+        self.min_shortlist = min_shortlist
+        # Quantize block by block so a float16 memory map is never upcast whole
+        blocks = [quantize(vectors[start:start + _SCORE_BLOCK], precision)
+                  for start in range(0, len(vectors), _SCORE_BLOCK)]
+        if blocks:
+            scales = [b.scales for b in blocks] if precision == "int8" else None
+            self.quantized = QuantizedVectors(precision, np.concatenate([b.codes for b in blocks]),
+                                          np.concatenate(scales) if scales else None, vectors.shape[1])
+        else:
+            self.quantized = quantize(np.empty((0, vectors.shape[1]), dtype=np.float32), precision)
+
+    def __len__(self) -> int:
+        return len(self.quantized.codes)
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        out_scores, out_ids = _empty_results(len(queries), top_k)
+        if len(self) == 0 or top_k <= 0:
+            return out_scores, out_ids
+        approx = approximate_scores(queries, self.quantized)
+        if not self.rescore:
+            best = top_k_indices(approx, top_k)
+            out_scores[:, :best.shape[1]] = np.take_along_axis(approx, best, axis=1)
+            out_ids[:, :best.shape[1]] = best
+            return out_scores, out_ids
+
+        shortlist = top_k_indices(approx, max(top_k * self.rescore_factor, self.min_shortlist))
+        for row, query in enumerate(queries):
+            # Sorted ids read the original rows front to back
+            candidates = np.sort(shortlist[row])
+            scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+            best = top_k_indices(scores, top_k)[0]
+            out_scores[row, :len(best)] = scores[best]
+            out_ids[row, :len(best)] = candidates[best]
+        return out_scores, out_ids
+
+
+INDEX_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFFlatIndex,
+    "int8": lambda vectors, **params: QuantizedIndex(vectors, precision="int8", **params),
+    "binary": lambda vectors, **params: QuantizedIndex(vectors, precision="binary", **params),
+}
+
+
+def build_index(vectors: np.ndarray, backend: str = "exact", **params) -> VectorIndex:
+    """Build the named index backend over unit-length float32 rows"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}', expected one of {sorted(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend](vectors, **params)
+
+
+def recall_at_k(exact_ids: np.ndarray, approx_ids: np.ndarray) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search also returned"""
+    hits = [
+        len(set(e[e >= 0]) & set(a[a >= 0])) / max(1, int((e >= 0).sum()))
+        for e, a in zip(exact_ids, approx_ids)
+    ]
+    return float(np.mean(hits)) if hits else 1.0
@@ -0,0 +1,290 @@
+"""Local query server that keeps MiniLM, TinyLlama and indexed collections warm.
+
+    python server.py --port 8765            # HTTP on 127.0.0.1
+    python server.py --unix /tmp/rag.sock   # HTTP over a Unix socket
+
+Endpoints (JSON in, JSON out):
+    GET  /health               queue and worker status
+    POST /index    {"collection"}                          (re)index a collection
+    POST /search   {"collection", "query", "top_k"}
+    POST /answer   {"collection", "query", "role", "top_k", "top_k_per_pdf"}
+    POST /outline  {"pdf_path"}                            HeadingExtractor outline
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from app import LLM_INSTANCES, LLM_SEED, build_corpus, build_searcher, generate_answers, load_embedder
+from scripts.input_loader import get_required_pdfs, load_input_json
+from scripts.searcher import SemanticSearcher
+from scripts.prioritizer import prioritize_chunks
+from scripts.llm_generator import TinyLlamaGenerator
+
+MAX_BODY_BYTES = 1024 * 1024
+# HeadingExtractor's text extraction library for /outline: "pdfminer" or "pymupdf"
+EXTRACT_BACKEND = os.environ.get("EXTRACT_BACKEND", "pdfminer")
+
+
+class RequestError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryService:
+    """Models and resident collections shared by every request"""
+
+    def __init__(self, input_dir: Path, heading_extractor_dir: Path):
+        self.input_dir = input_dir
+        self.heading_extractor_dir = heading_extractor_dir
+        self.embedder = load_embedder()
+        self._llama: Optional[TinyLlamaGenerator] = None
+        self._searchers: Dict[str, SemanticSearcher] = {}
+        self._inputs: Dict[str, dict] = {}
+        # Indexing rewrites store files; generation is scheduled by the generator's own pool
+        self._index_lock = threading.Lock()
+
+    @property
+    def llama(self) -> TinyLlamaGenerator:
+        if self._llama is None:
+            self._llama = TinyLlamaGenerator(n_instances=LLM_INSTANCES, seed=LLM_SEED,
+                                             embedder=self.embedder)
+        return self._llama
+
+    def _collection_dir(self, payload: Dict) -> Tuple[str, Path]:
+        name = payload.get("collection")
+        if not name:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'collection' is required")
+        collection_dir = (self.input_dir / name).resolve()
+        if self.input_dir.resolve() not in collection_dir.parents or not collection_dir.is_dir():
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown collection '{name}'")
+        return name, collection_dir
+
+    def index(self, payload: Dict) -> Dict:
+        name, collection_dir = self._collection_dir(payload)
+        with self._index_lock:
+            return self._index_locked(name, collection_dir)
+
+    def _index_locked(self, name: str, collection_dir: Path) -> Dict:
+        """Build the collection's store and searcher; the caller holds _index_lock"""
+        input_path = collection_dir / "challenge1b_input.json"
+        if input_path.exists():
+            input_json = load_input_json(collection_dir)
+            pdf_paths = get_required_pdfs(collection_dir, input_json)
+        else:
+            input_json = {}
+            pdf_paths = sorted((collection_dir / "PDFs").glob("*.pdf"))
+        store = build_corpus(collection_dir, pdf_paths, self.embedder)
+        self._searchers[name] = build_searcher(store)
+        self._inputs[name] = input_json
+        return {"collection": name, "pdfs": len(pdf_paths), "chunks": len(store)}
+
+    def _searcher(self, payload: Dict) -> Tuple[str, SemanticSearcher]:
+        name, collection_dir = self._collection_dir(payload)
+        searcher = self._searchers.get(name)
+        if searcher is None:
+            with self._index_lock:
+                # Another request may have indexed it while this one waited for the lock
+                if name not in self._searchers:
+                    self._index_locked(name, collection_dir)
+                searcher = self._searchers[name]
+        return name, searcher
+
+    def search(self, payload: Dict) -> Dict:
+        name, searcher = self._searcher(payload)
+        query = self._query(name, payload)
+        return {"results": searcher.search(query, top_k=int(payload.get("top_k", 25)))}
+
+    def answer(self, payload: Dict) -> Dict:
+        name, searcher = self._searcher(payload)
+        query = self._query(name, payload)
+        role = payload.get("role") or self._inputs[name].get("persona", {}).get("role", "")
+        query_vector = searcher.encode_queries([query])
+        raw_results = searcher.search_vectors(query_vector, top_k=int(payload.get("top_k", 25)),
+                                              queries=[query])[0]
+        top_chunks = prioritize_chunks(raw_results, top_k_per_pdf=int(payload.get("top_k_per_pdf", 3)))
+        refined_outputs = generate_answers(self.llama, role, query, top_chunks, query_vector=query_vector[0])
+        return {"top_chunks": top_chunks, "refined_outputs": refined_outputs}
+
+    def _query(self, name: str, payload: Dict) -> str:
+        query = payload.get("query") or self._inputs[name].get("job_to_be_done", {}).get("task")
+        if not query:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'query' is required")
+        return query
+
+    def outline(self, payload: Dict) -> Dict:
+        pdf_path = payload.get("pdf_path")
+        if not pdf_path or not Path(pdf_path).is_file():
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'pdf_path' must name an existing PDF")
+        extract_outline = self._heading_extractor().extract_outline
+        fd, output_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            # Share the warm MiniLM instead of loading HeadingExtractor's own copy; its
+            # encodes take the same lock as the embedder's and searchers'
+            return extract_outline(pdf_path, output_path,
+                                   base_path=str(self.heading_extractor_dir / "embeddings"),
+                                   model=self.embedder.shared_model(), extract_backend=EXTRACT_BACKEND)
+        finally:
+            os.unlink(output_path)
+
+    def _heading_extractor(self):
+        if str(self.heading_extractor_dir) not in sys.path:
+            sys.path.append(str(self.heading_extractor_dir))
+        return importlib.import_module("src.outline")
+
+
+class QueryServer:
+    """Minimal HTTP/1.1 JSON server with a concurrency limit and a bounded wait queue.
+
+    At most max_concurrency requests run at once on worker threads; up to
+    max_queue more wait for a slot, and anything beyond that is rejected with
+    503 so callers back off instead of piling up.
+    """
+
+    def __init__(self, service: QueryService, max_concurrency: int = 4, max_queue: int = 32):
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.routes: Dict[Tuple[str, str], Callable[[Dict], Dict]] = {
+            ("GET", "/health"): self.health,
+            ("POST", "/index"): service.index,
+            ("POST", "/search"): service.search,
+            ("POST", "/answer"): service.answer,
+            ("POST", "/outline"): service.outline,
+        }
+
+    def health(self, payload: Dict) -> Dict:
+        return {"status": "ok", "active": self.active, "waiting": self.waiting}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = await self._serve_one(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_one(self, request_line: bytes, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> bool:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+
+        try:
+            method, target, _ = request_line.decode("latin1").split(" ", 2)
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+            body = await reader.readexactly(length) if length else b""
+            status, payload = await self.dispatch(method, target.split("?", 1)[0], body)
+        except RequestError as e:
+            status, payload = e.status, {"error": str(e)}
+        except ValueError:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": "Malformed request"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin1") + data)
+        return keep_alive
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, Dict]:
+        handler = self.routes.get((method, path))
+        if handler is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        if handler == self.health:
+            return HTTPStatus.OK, self.health(payload)
+
+        if self.waiting >= self.max_queue:
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, retry later")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return HTTPStatus.OK, await loop.run_in_executor(self.executor, handler, payload)
+        except RequestError:
+            raise
+        except Exception as e:
+            print(f"🔥 {method} {path} failed: {type(e).__name__}: {e}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.active -= 1
+            self.slots.release()
+
+
+async def serve(args):
+    service = QueryService(Path(args.input), Path(args.heading_extractor).resolve())
+    for name in args.preload:
+        service.index({"collection": name})
+    server = QueryServer(service, max_concurrency=args.max_concurrency, max_queue=args.max_queue)
+
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.unix)
+        print(f"🚀 Serving on unix:{args.unix}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host=args.host, port=args.port)
+        print(f"🚀 Serving on http://{args.host}:{args.port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local query server with warm models")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (local only by default)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument("--input", default="./input", help="Directory holding the collections")
+    parser.add_argument("--heading-extractor", default="../HeadingExtractor",
+                        help="HeadingExtractor checkout used by /outline")
+    parser.add_argument("--preload", nargs="*", default=[], help="Collections to index at startup")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=32)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped")
+
+
+if __name__ == "__main__":
+    main()